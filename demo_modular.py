@@ -10,11 +10,20 @@ This script showcases all the key features of the refactored package:
 - Utility functions
 """
 
+import contextlib
+import functools
+import importlib.util
+import io
+import logging
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-# Add current directory to path for package import
-sys.path.insert(0, str(Path(__file__).parent))
+# Add current directory to path for package import, unless the package is
+# already importable (installed, or run from this directory)
+if importlib.util.find_spec('fiji_automator') is None:
+    sys.path.insert(0, str(Path(__file__).parent))
 
 from fiji_automator import (
     ThunderSTORMAutomator, 
@@ -25,6 +34,45 @@ from fiji_automator import (
 )
 
 
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def batched_output(func):
+    """Emit a demo section's output with a single write when stdout is not a terminal."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if sys.stdout.isatty():
+            return func(*args, **kwargs)
+        
+        buffer = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(buffer):
+                return func(*args, **kwargs)
+        finally:
+            sys.stdout.write(buffer.getvalue())
+    return wrapper
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Log to the current sys.stdout, so batched sections capture log messages too."""
+    def emit(self, record):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+def iter_tiff_files(directory):
+    """Yield TIFF files in a directory using a single scandir pass."""
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.lower().endswith(TIFF_EXTENSIONS):
+                    yield Path(entry.path)
+    except OSError:
+        # Missing or unreadable directory
+        return
+
+
+@batched_output
 def demo_configuration():
     """Demonstrate configuration management."""
     print("🔧 Configuration Management")
@@ -54,6 +102,7 @@ def demo_configuration():
     print("✅ Configuration system working\n")
 
 
+@batched_output
 def demo_file_utilities():
     """Demonstrate file utility functions."""
     print("📁 File Utilities")
@@ -82,34 +131,35 @@ def demo_file_utilities():
     print("✅ File utilities working\n")
 
 
+@batched_output
 def demo_image_utilities():
     """Demonstrate image processing utilities."""
     print("🖼️ Image Utilities")
     print("-" * 40)
     
-    test_cases_dir = Path("test_cases")
-    tiff_files = list(test_cases_dir.glob("*.tif*"))
+    tiff_iter = iter_tiff_files("test_cases")
+    first_file = next(tiff_iter, None)
     
-    if tiff_files:
-        test_file = tiff_files[0]
-        print(f"Analyzing: {test_file.name}")
+    if first_file is not None:
+        tiff_files = [first_file, *tiff_iter]
         
-        # Validate TIFF file
-        is_valid = ImageUtils.validate_tiff_file(test_file)
-        print(f"Valid TIFF: {is_valid}")
+        # Validate and probe each file with a single open, several files at a time
+        with ThreadPoolExecutor(max_workers=min(8, len(tiff_files))) as executor:
+            results = list(executor.map(ImageUtils.validate_and_info, tiff_files))
         
-        # Get detailed image information
-        info = ImageUtils.get_image_info(test_file)
-        print(f"File size: {info['size_bytes'] / (1024*1024):.1f} MB")
-        
-        if 'width' in info and 'height' in info:
-            print(f"Dimensions: {info['width']} × {info['height']} pixels")
-        
-        if 'n_frames' in info:
-            print(f"Number of frames: {info['n_frames']}")
-        
-        if 'format' in info:
-            print(f"Image format: {info['format']}")
+        for test_file, (is_valid, info) in zip(tiff_files, results):
+            print(f"Analyzing: {test_file.name}")
+            print(f"Valid TIFF: {is_valid}")
+            print(f"File size: {info['size_bytes'] / (1024*1024):.1f} MB")
+            
+            if 'width' in info and 'height' in info:
+                print(f"Dimensions: {info['width']} × {info['height']} pixels")
+            
+            if 'n_frames' in info:
+                print(f"Number of frames: {info['n_frames']}")
+            
+            if 'format' in info:
+                print(f"Image format: {info['format']}")
         
         print("✅ Image utilities working")
     else:
@@ -118,6 +168,7 @@ def demo_image_utilities():
     print()
 
 
+@batched_output
 def demo_fiji_setup():
     """Demonstrate Fiji setup capabilities."""
     print("⚙️ Fiji Setup")
@@ -154,6 +205,7 @@ def demo_fiji_setup():
     print("✅ Setup system working\n")
 
 
+@batched_output
 def demo_thunderstorm_automator():
     """Demonstrate ThunderSTORM automator."""
     print("⚡ ThunderSTORM Automator")
@@ -172,21 +224,14 @@ def demo_thunderstorm_automator():
             print("⚠ Fiji test failed")
         
         # Test with real file
-        test_cases_dir = Path("test_cases")
-        tiff_files = list(test_cases_dir.glob("*.tif*"))
+        test_file = next(iter_tiff_files("test_cases"), None)
         
-        if tiff_files:
-            test_file = tiff_files[0]
+        if test_file:
             print(f"Testing with: {test_file.name}")
             
-            # Validate input file
+            # Validate input file (also reports the image size and frame count)
             if automator.validate_input_file(str(test_file)):
                 print("✅ Input file validation passed")
-                
-                # Get image information
-                img_info = automator.get_image_info(str(test_file))
-                print(f"Image analysis: {img_info['width']}×{img_info['height']} pixels")
-                
                 print("🎯 Ready for ThunderSTORM analysis!")
             else:
                 print("⚠ Input file validation failed")
@@ -198,6 +243,7 @@ def demo_thunderstorm_automator():
     print()
 
 
+@batched_output
 def demo_package_structure():
     """Show the modular package structure."""
     print("📦 Package Structure")
@@ -208,18 +254,18 @@ def demo_package_structure():
     print(f"Package version: {fiji_automator.__version__}")
     print(f"Available classes: {', '.join(fiji_automator.__all__)}")
     
-    # Show module locations
+    # Show module locations without importing the submodules
     modules = ['core', 'setup', 'config', 'utils']
     for module in modules:
-        try:
-            mod = getattr(fiji_automator, module)
-            print(f"✅ {module} module loaded")
-        except AttributeError:
+        if importlib.util.find_spec(f'fiji_automator.{module}') is not None:
+            print(f"✅ {module} module available")
+        else:
             print(f"❌ {module} module not available")
     
     print("✅ Modular structure working\n")
 
 
+@batched_output
 def demo_conda_environment():
     """Show conda environment information."""
     print("🐍 Environment Information")
@@ -242,10 +288,10 @@ def demo_conda_environment():
     
     print("Key dependencies:")
     for dep, desc in dependencies:
-        try:
-            __import__(dep)
+        # find_spec locates the module without importing it
+        if importlib.util.find_spec(dep) is not None:
             print(f"  ✅ {dep}: {desc}")
-        except ImportError:
+        else:
             print(f"  ❌ {dep}: {desc} (missing)")
     
     print("✅ Environment ready\n")
@@ -253,6 +299,11 @@ def demo_conda_environment():
 
 def main():
     """Run the complete demonstration."""
+    # Show the automator's progress messages alongside the demo output
+    handler = StdoutHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+    
     print("🔬 Fiji Automator - Modular Package Demonstration")
     print("=" * 60)
     print("This demo showcases the refactored, modular package structure\n")
@@ -4,10 +4,7 @@ Fiji Automator Package
 A Python package for automated ThunderSTORM analysis using Fiji/ImageJ.
 """
 
-from .core import ThunderSTORMAutomator
-from .setup import FijiSetup
-from .config import Config
-from .utils import ImageUtils, FileUtils
+import importlib
 
 __version__ = "1.2.0"
 __author__ = "Fiji Automator Team"
@@ -15,8 +12,39 @@ __email__ = "support@fiji-automator.com"
 
 __all__ = [
     'ThunderSTORMAutomator',
+    'ThunderSTORMSession',
     'FijiSetup', 
     'Config',
     'ImageUtils',
     'FileUtils'
-] 
\ No newline at end of file
+]
+
+# Public names are resolved from their submodules on first access (PEP 562),
+# so importing only Config does not pull in the rest of the package.
+_LAZY = {
+    'ThunderSTORMAutomator': 'core',
+    'ThunderSTORMSession': 'core',
+    'FijiSetup': 'setup',
+    'Config': 'config',
+    'ImageUtils': 'utils',
+    'FileUtils': 'utils'
+}
+
+_SUBMODULES = ('core', 'setup', 'config', 'utils')
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        module = importlib.import_module(f'.{_LAZY[name]}', __name__)
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_SUBMODULES))
@@ -8,15 +8,190 @@ import os
 import sys
 import platform
 from pathlib import Path
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Callable, Dict, Any, List, Mapping, Optional, Tuple
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _loads(data: bytes) -> Any:
+    """Parse JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(obj: Any) -> str:
+    """Serialize to indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, indent=2)
+
+
+# Resolved once at import; the default tree below is built a single time,
+# frozen, and shared by every Config until it is modified.
+_HOME = Path.home()
+
+# The operating system cannot change while the process is running
+_PLATFORM = platform.system().lower()
+
+# macOS and Windows file systems match names case-insensitively by default
+_CASE_INSENSITIVE_FS = _PLATFORM in ("darwin", "windows")
+
+
+def _default_cache_dir() -> Path:
+    """Get the per-user cache directory for the current platform."""
+    if _PLATFORM == "windows":
+        base = Path(os.environ.get("LOCALAPPDATA", _HOME / "AppData" / "Local"))
+    elif _PLATFORM == "darwin":
+        base = _HOME / "Library" / "Caches"
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME", _HOME / ".cache"))
+    return base / "fiji_automator"
+
+
+def _build_default_config() -> Dict[str, Any]:
+    """
+    Build the default configuration tree.
+    
+    Returns:
+        Dict[str, Any]: Default configuration
+    """
+    return {
+        "fiji": {
+            "urls": {
+                "windows": "https://downloads.imagej.net/fiji/latest/fiji-win64.zip",
+                "darwin": "https://downloads.imagej.net/fiji/latest/fiji-macosx.zip",
+                "linux": "https://downloads.imagej.net/fiji/latest/fiji-linux64.zip"
+            },
+            "install_paths": {
+                "windows": [
+                    r"C:\Program Files\Fiji.app\ImageJ-win64.exe",
+                    r"C:\Program Files (x86)\Fiji.app\ImageJ-win64.exe",
+                    str(_HOME / "Fiji.app" / "ImageJ-win64.exe"),
+                    str(_HOME / "Desktop" / "Fiji.app" / "ImageJ-win64.exe")
+                ],
+                "darwin": [
+                    "/Applications/Fiji.app/Contents/MacOS/ImageJ-macosx",
+                    "/Applications/Fiji.app/Contents/MacOS/ImageJ-macosx64",
+                    str(_HOME / "Applications" / "Fiji.app" / "Contents" / "MacOS" / "ImageJ-macosx")
+                ],
+                "linux": [
+                    str(_HOME / "Fiji.app" / "ImageJ-linux64"),
+                    "/opt/Fiji.app/ImageJ-linux64"
+                ]
+            },
+            # Expected SHA-256 of each platform's archive; the "latest" builds
+            # change over time, so none are pinned by default
+            "sha256": {},
+            "default_install_dirs": {
+                "windows": os.environ.get("PROGRAMFILES", "C:\\Program Files"),
+                "darwin": "/Applications",
+                "linux": str(_HOME)
+            }
+        },
+        "thunderstorm": {
+            "github_api_url": "https://api.github.com/repos/zitmen/thunderstorm/releases/latest",
+            "default_parameters": {
+                "pixel_size": 100.0,
+                "gain": 100.0,
+                "offset": 100.0,
+                "processing_method": "Wavelet filter (B-Spline)",
+                "localization_method": "PSF: Integrated Gaussian",
+                "sigma": 1.6,
+                "fitting_radius": 3,
+                "threshold_offset": 500,
+                "create_reconstructed_image": True,
+                "save_macro": False,
+                "verbose_verification": False
+            }
+        },
+        "cache": {
+            "dir": str(_default_cache_dir())
+        },
+        "analysis": {
+            "timeout": 300,  # 5 minutes
+            "output_files": [
+                "results.csv",
+                "reconstructed_image.tif"
+            ]
+        }
+    }
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Recursively convert dicts to read-only mappings and lists to tuples.
+    
+    String keys and values are interned, so paths and names built at runtime
+    share storage with equal strings elsewhere in the process.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({sys.intern(k): _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """Recursively convert a frozen tree back into plain dicts and lists."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_thaw(v) for v in value]
+    return value
+
+
+_DEFAULT_CONFIG = _freeze(_build_default_config())
+
+
+def _list_file_names(directory: str) -> Optional[set]:
+    """
+    List the names of the regular files in a directory.
+    
+    Returns an empty set if the directory does not exist, and None if it
+    cannot be listed (files in it may still be reachable by path).
+    """
+    try:
+        with os.scandir(directory or '.') as entries:
+            return {entry.name for entry in entries if entry.is_file()}
+    except PermissionError:
+        return None
+    except OSError:
+        return set()
+
+
+# Dot-notation keys already split into their components
+_KEY_CACHE: Dict[str, Tuple[str, ...]] = {}
+
+
+def _split_key(key: str) -> Tuple[str, ...]:
+    """Split a dot-notation key, reusing the result for repeated keys."""
+    keys = _KEY_CACHE.get(key)
+    if keys is None:
+        keys = _KEY_CACHE.setdefault(key, tuple(key.split('.')))
+    return keys
+
 
 class Config:
     """
     Configuration management for Fiji Automator.
     """
     
+    # Pre-split keys for the accessor methods below
+    _FIJI_URLS_KEY = ('fiji', 'urls')
+    _THUNDERSTORM_API_URL_KEY = ('thunderstorm', 'github_api_url')
+    _DEFAULT_PARAMETERS_KEY = ('thunderstorm', 'default_parameters')
+    _ANALYSIS_TIMEOUT_KEY = ('analysis', 'timeout')
+    _OUTPUT_FILES_KEY = ('analysis', 'output_files')
+    _CACHE_DIR_KEY = ('cache', 'dir')
+    
     def __init__(self, config_file: Optional[str] = None):
         """
         Initialize configuration.
@@ -24,73 +199,64 @@ class Config:
         Args:
             config_file (str, optional): Path to custom configuration file
         """
-        self.platform = platform.system().lower()
+        self.platform = _PLATFORM
         self.config_file = config_file
-        self.config = self._load_default_config()
+        self._config = self._load_default_config()
         
         if config_file and Path(config_file).exists():
             self._load_config_file(config_file)
+        
+        self._snapshot_values()
     
-    def _load_default_config(self) -> Dict[str, Any]:
+    def _snapshot_values(self):
+        """
+        Resolve the settings for the current platform and the other accessor
+        values once, so the accessors below can return them without walking
+        the configuration tree.
+        """
+        p = self.platform
+        self._install_paths = self._get_keys(('fiji', 'install_paths', p), [])
+        self._install_candidates = tuple((path, *os.path.split(path)) for path in self._install_paths)
+        self._default_install_dir = self._get_keys(('fiji', 'default_install_dirs', p), str(_HOME))
+        self._fiji_url = self._get_keys(('fiji', 'urls', p))
+        self._fiji_urls = self._get_keys(self._FIJI_URLS_KEY, {})
+        self._thunderstorm_api_url = self._get_keys(self._THUNDERSTORM_API_URL_KEY, '')
+        self._default_parameters = self._get_keys(self._DEFAULT_PARAMETERS_KEY, {})
+        self._analysis_timeout = self._get_keys(self._ANALYSIS_TIMEOUT_KEY, 300)
+        self._output_files = self._get_keys(self._OUTPUT_FILES_KEY, [])
+        cache_dir = self._get_keys(self._CACHE_DIR_KEY)
+        self._cache_dir = str(_default_cache_dir()) if cache_dir is None else cache_dir
+    
+    @property
+    def config(self) -> Mapping[str, Any]:
+        """Read-only view of the configuration tree; change it with set()."""
+        return self._config
+    
+    def _load_default_config(self) -> Mapping[str, Any]:
         """
         Load default configuration settings.
         
+        The returned tree is read-only and shared with other instances.
+        
         Returns:
-            Dict[str, Any]: Default configuration
-        """
-        return {
-            "fiji": {
-                "urls": {
-                    "windows": "https://downloads.imagej.net/fiji/latest/fiji-win64.zip",
-                    "darwin": "https://downloads.imagej.net/fiji/latest/fiji-macosx.zip",
-                    "linux": "https://downloads.imagej.net/fiji/latest/fiji-linux64.zip"
-                },
-                "install_paths": {
-                    "windows": [
-                        r"C:\Program Files\Fiji.app\ImageJ-win64.exe",
-                        r"C:\Program Files (x86)\Fiji.app\ImageJ-win64.exe",
-                        str(Path.home() / "Fiji.app" / "ImageJ-win64.exe"),
-                        str(Path.home() / "Desktop" / "Fiji.app" / "ImageJ-win64.exe")
-                    ],
-                    "darwin": [
-                        "/Applications/Fiji.app/Contents/MacOS/ImageJ-macosx",
-                        "/Applications/Fiji.app/Contents/MacOS/ImageJ-macosx64",
-                        str(Path.home() / "Applications" / "Fiji.app" / "Contents" / "MacOS" / "ImageJ-macosx")
-                    ],
-                    "linux": [
-                        str(Path.home() / "Fiji.app" / "ImageJ-linux64"),
-                        "/opt/Fiji.app/ImageJ-linux64"
-                    ]
-                },
-                "default_install_dirs": {
-                    "windows": os.environ.get("PROGRAMFILES", "C:\\Program Files"),
-                    "darwin": "/Applications",
-                    "linux": str(Path.home())
-                }
-            },
-            "thunderstorm": {
-                "github_api_url": "https://api.github.com/repos/zitmen/thunderstorm/releases/latest",
-                "default_parameters": {
-                    "pixel_size": 100.0,
-                    "gain": 100.0,
-                    "offset": 100.0,
-                    "processing_method": "Wavelet filter (B-Spline)",
-                    "localization_method": "PSF: Integrated Gaussian",
-                    "sigma": 1.6,
-                    "fitting_radius": 3,
-                    "threshold_offset": 500,
-                    "create_reconstructed_image": True
-                }
-            },
-            "analysis": {
-                "timeout": 300,  # 5 minutes
-                "output_files": [
-                    "results.csv",
-                    "reconstructed_image.tif",
-                    "thunderstorm_macro.ijm"
-                ]
-            }
-        }
+            Mapping[str, Any]: Default configuration
+        """
+        return _DEFAULT_CONFIG
+    
+    def _update_config(self, update: Callable[[Dict[str, Any]], None]):
+        """
+        Apply a change to a private copy of the tree and refresh the accessors.
+        
+        Every change goes through here, so the values resolved by
+        _snapshot_values() can never go stale.
+        
+        Args:
+            update (Callable): Function modifying the (plain dict) tree in place
+        """
+        config = _thaw(self._config)
+        update(config)
+        self._config = _freeze(config)
+        self._snapshot_values()
     
     def _load_config_file(self, config_file: str):
         """
@@ -100,9 +266,8 @@ class Config:
             config_file (str): Path to configuration file
         """
         try:
-            with open(config_file, 'r') as f:
-                custom_config = json.load(f)
-                self._merge_config(custom_config)
+            custom_config = _loads(Path(config_file).read_bytes())
+            self._merge_config(custom_config)
         except Exception as e:
             print(f"Warning: Could not load config file {config_file}: {e}")
     
@@ -113,14 +278,18 @@ class Config:
         Args:
             custom_config (Dict[str, Any]): Custom configuration to merge
         """
-        def merge_dict(base: Dict[str, Any], update: Dict[str, Any]):
-            for key, value in update.items():
-                if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                    merge_dict(base[key], value)
-                else:
-                    base[key] = value
+        def merge(config: Dict[str, Any]):
+            # Walk nested sections with an explicit stack instead of recursion
+            stack = [(config, custom_config)]
+            while stack:
+                base, update = stack.pop()
+                for key, value in update.items():
+                    if isinstance(value, dict) and isinstance(base.get(key), dict):
+                        stack.append((base[key], value))
+                    else:
+                        base[key] = value
         
-        merge_dict(self.config, custom_config)
+        self._update_config(merge)
     
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -130,14 +299,26 @@ class Config:
             key (str): Configuration key (e.g., 'fiji.urls.windows')
             default (Any): Default value if key not found
             
+        Returns:
+            Any: Configuration value (sections and lists as plain copies)
+        """
+        return _thaw(self._get_keys(_split_key(key), default))
+    
+    def _get_keys(self, keys: Tuple[str, ...], default: Any = None) -> Any:
+        """
+        Get configuration value from an already split key.
+        
+        Args:
+            keys (Tuple[str, ...]): Key components (e.g., ('fiji', 'urls'))
+            default (Any): Default value if key not found
+            
         Returns:
             Any: Configuration value
         """
-        keys = key.split('.')
-        value = self.config
+        value = self._config
         
         for k in keys:
-            if isinstance(value, dict) and k in value:
+            if isinstance(value, (dict, MappingProxyType)) and k in value:
                 value = value[k]
             else:
                 return default
@@ -152,45 +333,90 @@ class Config:
             key (str): Configuration key (e.g., 'fiji.urls.windows')
             value (Any): Value to set
         """
-        keys = key.split('.')
-        config = self.config
+        keys = _split_key(key)
         
-        for k in keys[:-1]:
-            if k not in config:
-                config[k] = {}
-            config = config[k]
+        def assign(config: Dict[str, Any]):
+            for k in keys[:-1]:
+                config = config.setdefault(k, {})
+            config[keys[-1]] = value
         
-        config[keys[-1]] = value
+        self._update_config(assign)
     
     def get_fiji_urls(self) -> Dict[str, str]:
         """Get Fiji download URLs for all platforms."""
-        return self.get('fiji.urls', {})
+        return dict(self._fiji_urls)
+    
+    def get_fiji_url(self, platform: Optional[str] = None) -> Optional[str]:
+        """Get the Fiji download URL for the specified platform."""
+        if platform is None or platform == self.platform:
+            return self._fiji_url
+        return self._get_keys(('fiji', 'urls', platform))
+    
+    def get_fiji_sha256(self, platform: Optional[str] = None) -> Optional[str]:
+        """Get the expected SHA-256 of the Fiji archive for the specified platform."""
+        return self._get_keys(('fiji', 'sha256', platform or self.platform)) or None
     
-    def get_fiji_install_paths(self, platform: Optional[str] = None) -> list:
+    def get_fiji_install_paths(self, platform: Optional[str] = None) -> List[str]:
         """Get Fiji installation paths for the specified platform."""
-        platform = platform or self.platform
-        return self.get(f'fiji.install_paths.{platform}', [])
+        if platform is None or platform == self.platform:
+            return list(self._install_paths)
+        return list(self._get_keys(('fiji', 'install_paths', platform), []))
     
     def get_fiji_default_install_dir(self, platform: Optional[str] = None) -> str:
         """Get default Fiji installation directory for the specified platform."""
-        platform = platform or self.platform
-        return self.get(f'fiji.default_install_dirs.{platform}', str(Path.home()))
+        if platform is None or platform == self.platform:
+            return self._default_install_dir
+        return self._get_keys(('fiji', 'default_install_dirs', platform), str(_HOME))
+    
+    def resolve_existing_install_path(self) -> Optional[str]:
+        """
+        Find the first Fiji installation path for this platform that exists.
+        
+        Candidates are grouped by parent directory so each directory is
+        listed once, rather than stat-ing every candidate separately.
+        
+        Returns:
+            Optional[str]: First existing installation path, or None
+        """
+        present: Dict[str, Optional[set]] = {}
+        
+        # Keep the configured order so earlier candidates take priority; a
+        # directory is only listed once a candidate inside it is reached
+        for path, parent, name in self._install_candidates:
+            if parent not in present:
+                present[parent] = _list_file_names(parent)
+            names = present[parent]
+            if names is None:
+                # Searchable but unreadable directory: check the path itself
+                if os.path.isfile(path):
+                    return path
+            elif name in names:
+                return path
+            elif _CASE_INSENSITIVE_FS and os.path.isfile(path):
+                # The listing holds the on-disk spelling (e.g. fiji.app for Fiji.app)
+                return path
+        
+        return None
     
     def get_thunderstorm_api_url(self) -> str:
         """Get ThunderSTORM GitHub API URL."""
-        return self.get('thunderstorm.github_api_url', '')
+        return self._thunderstorm_api_url
     
     def get_default_parameters(self) -> Dict[str, Any]:
         """Get default ThunderSTORM analysis parameters."""
-        return self.get('thunderstorm.default_parameters', {})
+        return dict(self._default_parameters)
     
     def get_analysis_timeout(self) -> int:
         """Get analysis timeout in seconds."""
-        return self.get('analysis.timeout', 300)
+        return self._analysis_timeout
     
-    def get_expected_output_files(self) -> list:
+    def get_expected_output_files(self) -> List[str]:
         """Get list of expected output files from analysis."""
-        return self.get('analysis.output_files', [])
+        return list(self._output_files)
+    
+    def get_cache_dir(self) -> str:
+        """Get the directory used for cached lookups (e.g., the Fiji path)."""
+        return self._cache_dir
     
     def save_config(self, config_file: Optional[str] = None):
         """
@@ -202,15 +428,14 @@ class Config:
         config_file = config_file or self.config_file or "config.json"
         
         try:
-            with open(config_file, 'w') as f:
-                json.dump(self.config, f, indent=2)
+            Path(config_file).write_text(_dumps(_thaw(self._config)))
             print(f"Configuration saved to {config_file}")
         except Exception as e:
             print(f"Error saving configuration: {e}")
     
     def print_config(self):
         """Print current configuration."""
-        print(json.dumps(self.config, indent=2))
+        print(_dumps(_thaw(self._config)))
 
 
 # Global configuration instance
@@ -229,4 +454,14 @@ def get_config(config_file: Optional[str] = None) -> Config:
     global _config
     if _config is None:
         _config = Config(config_file)
-    return _config 
\ No newline at end of file
+    return _config 
+
+
+def get_platform() -> str:
+    """
+    Get the current platform name.
+    
+    Returns:
+        str: Lowercase platform name (e.g., 'linux', 'darwin', 'windows')
+    """
+    return _PLATFORM
@@ -7,13 +7,253 @@ Contains the main ThunderSTORM automation logic.
 
 import os
 import sys
+import json
+import asyncio
+import functools
+import logging
+import queue
+import shlex
+import subprocess
 import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from string import Template
+from typing import Optional, Dict, Any, List, NamedTuple, Tuple, Union
 
 from .config import get_config
 from .utils import FileUtils, ProcessUtils, ImageUtils
 
+logger = logging.getLogger(__name__)
+
+
+# ImageJ macro for ThunderSTORM analysis, split so the templates below are
+# assembled once rather than on every call
+_MACRO_ANALYSIS = """
+        // ThunderSTORM Analysis Macro
+        print("Starting ThunderSTORM analysis...");
+        
+        // Skip image display and repaints while the analysis runs
+        setBatchMode(true);
+        
+        // Open the input image
+        open("$input_path");
+        print("Opened input file: $input_path");
+        
+        // Ensure the image is selected
+        if (nImages == 0) {
+            print("Error: No images are open!");
+            exit();
+        }
+        
+        // Run ThunderSTORM analysis
+        // The plugin should be accessible via the Plugins menu
+        run("Run analysis",
+            "filter='$processing_method' " +
+            "detector='[Local maximum]' " +
+            "estimator='$localization_method' " +
+            "sigma=$sigma " +
+            "fitradius=$fitting_radius " +
+            "method='[Weighted Least squares]' " +
+            "camera.gain=$gain " +
+            "camera.offset=$offset " +
+            "camera.pixelsize=$pixel_size");
+        
+        print("ThunderSTORM analysis completed.");
+        
+        // Export the localization results to a CSV file
+        run("Export results", 
+            "filepath='$output_dir/results.csv' " +
+            "fileformat=[CSV (comma separated)] " +
+            "x=true y=true sigma=true intensity=true offset=true " +
+            "bkgstd=true uncertainty=true saveprotocol=true");
+        
+        print("Results exported to: $output_dir/results.csv");
+        """
+
+_MACRO_RECONSTRUCTION = """
+        
+        // Create and save super-resolved image
+        run("Visualization",
+            "imleft=0.0 imtop=0.0 imwidth=512.0 imheight=512.0 " +
+            "renderer='[Averaged shifted histograms]' " +
+            "magnification=5.0 " +
+            "colorizez=false " +
+            "threed=false " +
+            "shifts=2 " +
+            "repaint=50");
+        
+        if (nImages > 1) {
+            // Find and save the reconstructed image
+            for (i = 1; i <= nImages; i++) {
+                selectImage(i);
+                title = getTitle();
+                if (indexOf(title, "Reconstructed") >= 0 || indexOf(title, "Visualization") >= 0) {
+                    saveAs("Tiff", "$output_dir/reconstructed_image.tif");
+                    print("Super-resolved image saved: $output_dir/reconstructed_image.tif");
+                    break;
+                }
+            }
+        }
+        """
+
+_MACRO_CLOSE = """
+        
+        // Close all windows to allow Fiji to exit cleanly
+        setBatchMode(false);
+        run("Close All");
+        print("Analysis complete. All windows closed.");
+        """
+
+_MACRO_TEMPLATE_WITH_RECON = Template(_MACRO_ANALYSIS + _MACRO_RECONSTRUCTION + _MACRO_CLOSE)
+_MACRO_TEMPLATE_WITHOUT_RECON = Template(_MACRO_ANALYSIS + _MACRO_CLOSE)
+
+# Markers the batch macro prints with the index of each finished input
+_BATCH_FILE_DONE = "<<<FILE_DONE>>>"
+_BATCH_FILE_FAIL = "<<<FILE_FAIL>>>"
+
+# Batch variant: one macro loops over all inputs inside a single Fiji process
+_BATCH_MACRO_ANALYSIS = """
+        // ThunderSTORM Batch Analysis Macro
+        print("Starting ThunderSTORM batch analysis...");
+        
+        // Skip image display and repaints while the analysis runs
+        setBatchMode(true);
+        
+        inputs = newArray($input_paths);
+        outputs = newArray($output_dirs);
+        
+        for (f = 0; f < inputs.length; f++) {
+            open(inputs[f]);
+            print("Opened input file: " + inputs[f]);
+            
+            if (nImages == 0) {
+                print("Error: Could not open " + inputs[f]);
+                print("%(fail)s " + f);
+            } else {
+                run("Run analysis",
+                    "filter='$processing_method' " +
+                    "detector='[Local maximum]' " +
+                    "estimator='$localization_method' " +
+                    "sigma=$sigma " +
+                    "fitradius=$fitting_radius " +
+                    "method='[Weighted Least squares]' " +
+                    "camera.gain=$gain " +
+                    "camera.offset=$offset " +
+                    "camera.pixelsize=$pixel_size");
+                
+                run("Export results", 
+                    "filepath='" + outputs[f] + "/results.csv' " +
+                    "fileformat=[CSV (comma separated)] " +
+                    "x=true y=true sigma=true intensity=true offset=true " +
+                    "bkgstd=true uncertainty=true saveprotocol=true");
+                
+                print("Results exported to: " + outputs[f] + "/results.csv");
+        """ % {'fail': _BATCH_FILE_FAIL}
+
+_BATCH_MACRO_RECONSTRUCTION = """
+                run("Visualization",
+                    "imleft=0.0 imtop=0.0 imwidth=512.0 imheight=512.0 " +
+                    "renderer='[Averaged shifted histograms]' " +
+                    "magnification=5.0 " +
+                    "colorizez=false " +
+                    "threed=false " +
+                    "shifts=2 " +
+                    "repaint=50");
+                
+                for (i = 1; i <= nImages; i++) {
+                    selectImage(i);
+                    title = getTitle();
+                    if (indexOf(title, "Reconstructed") >= 0 || indexOf(title, "Visualization") >= 0) {
+                        saveAs("Tiff", outputs[f] + "/reconstructed_image.tif");
+                        print("Super-resolved image saved: " + outputs[f] + "/reconstructed_image.tif");
+                        break;
+                    }
+                }
+        """
+
+_BATCH_MACRO_CLOSE = """
+                print("%(done)s " + f);
+            }
+            
+            // Close this file's windows before moving to the next input
+            run("Close All");
+        }
+        
+        setBatchMode(false);
+        print("Batch analysis complete. All windows closed.");
+        """ % {'done': _BATCH_FILE_DONE}
+
+_BATCH_MACRO_TEMPLATE_WITH_RECON = Template(
+    _BATCH_MACRO_ANALYSIS + _BATCH_MACRO_RECONSTRUCTION + _BATCH_MACRO_CLOSE)
+_BATCH_MACRO_TEMPLATE_WITHOUT_RECON = Template(_BATCH_MACRO_ANALYSIS + _BATCH_MACRO_CLOSE)
+
+# Markers exchanged with the BeanShell loop of a ThunderSTORMSession
+_SESSION_END = "<<<END>>>"
+_SESSION_DONE = "<<<DONE>>>"
+_SESSION_EXIT = "<<<EXIT>>>"
+
+# BeanShell script run by a ThunderSTORMSession: collects macro lines from
+# stdin until the end marker, runs them, then reports the macro's result
+_SESSION_BOOTSTRAP = """
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+import ij.IJ;
+
+reader = new BufferedReader(new InputStreamReader(System.in));
+macro = new StringBuilder();
+while ((line = reader.readLine()) != null) {
+    if (line.equals("%(exit)s")) {
+        break;
+    }
+    if (line.equals("%(end)s")) {
+        result = IJ.runMacro(macro.toString());
+        System.out.println("%(done)s " + result);
+        System.out.flush();
+        macro.setLength(0);
+    } else {
+        macro.append(line).append("\\n");
+    }
+}
+System.exit(0);
+""" % {'end': _SESSION_END, 'done': _SESSION_DONE, 'exit': _SESSION_EXIT}
+
+
+class _CommandLine:
+    """Defers joining a command until a log record is actually formatted."""
+    
+    def __init__(self, cmd: List[str]):
+        self.cmd = cmd
+    
+    def __str__(self) -> str:
+        return shlex.join(self.cmd)
+
+
+class JobPaths(NamedTuple):
+    """Input and output paths of one analysis, raw and sanitized for ImageJ macros."""
+    input_raw: str
+    input_fwd: str
+    output_raw: str
+    output_fwd: str
+
+
+@functools.lru_cache(maxsize=32)
+def _render_macro(template: Template, params: Tuple[Tuple[str, type, Any], ...],
+                  input_path: str, output_dir: str) -> str:
+    """
+    Fill in a macro template; repeated runs with the same settings reuse the result.
+    
+    Parameters are (name, type, value) triples, so values that compare
+    equal but print differently (1, 1.0, True) are cached separately.
+    """
+    return template.substitute({name: value for name, _, value in params},
+                               input_path=input_path, output_dir=output_dir)
+
+
+def _macro_string(value: str) -> str:
+    """Quote a value as an ImageJ macro string literal."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
 
 class ThunderSTORMAutomator:
     """
@@ -26,6 +266,10 @@ class ThunderSTORMAutomator:
        - Download the .jar file from GitHub and place it in Fiji.app/plugins/
     """
     
+    # Startup notices are printed once per process, not per instance
+    _plugin_notice_shown = False
+    _reported_fiji_paths = set()
+    
     def __init__(self, fiji_path: Optional[str] = None, config_file: Optional[str] = None):
         """
         Initializes the automator and finds the Fiji executable.
@@ -36,9 +280,14 @@ class ThunderSTORMAutomator:
         """
         self.config = get_config(config_file)
         
-        # Try to find Fiji executable if no path is provided
+        # Try to find Fiji executable if no path is provided, starting with
+        # the path found by a previous run
         if fiji_path is None:
-            fiji_path = self._find_fiji_executable()
+            fiji_path = self._load_cached_fiji_path()
+            if fiji_path is None:
+                fiji_path = self._find_fiji_executable()
+                if fiji_path:
+                    self._save_cached_fiji_path(fiji_path)
 
         if not fiji_path or not Path(fiji_path).exists():
             raise FileNotFoundError(
@@ -50,7 +299,9 @@ class ThunderSTORMAutomator:
             )
         
         self.fiji_path = fiji_path
-        print(f"Fiji executable found at: {self.fiji_path}")
+        if fiji_path not in ThunderSTORMAutomator._reported_fiji_paths:
+            ThunderSTORMAutomator._reported_fiji_paths.add(fiji_path)
+            logger.info("Fiji executable found at: %s", self.fiji_path)
         
         # Verify ThunderSTORM plugin availability
         self._verify_thunderstorm_plugin()
@@ -62,25 +313,64 @@ class ThunderSTORMAutomator:
         Returns:
             Optional[str]: Path to Fiji executable or None if not found
         """
-        possible_paths = self.config.get_fiji_install_paths()
+        return self.config.resolve_existing_install_path()
+
+    def _fiji_path_cache_file(self) -> Path:
+        """Get the path of the file caching the discovered Fiji executable."""
+        return Path(self.config.get_cache_dir()) / "fiji_path.json"
+    
+    def _load_cached_fiji_path(self) -> Optional[str]:
+        """
+        Load the Fiji executable path saved by a previous run.
+        
+        Returns:
+            Optional[str]: Cached path if it is for this platform and still exists
+        """
+        try:
+            with open(self._fiji_path_cache_file(), 'r') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
         
-        # Check each possible path
-        for path in possible_paths:
-            if Path(path).exists():
-                return path
+        if not isinstance(cached, dict) or cached.get("platform") != self.config.platform:
+            return None
         
+        path = cached.get("path")
+        if path and Path(path).exists():
+            return path
         return None
-
+    
+    def _save_cached_fiji_path(self, fiji_path: str):
+        """
+        Save the discovered Fiji executable path for later runs.
+        
+        Args:
+            fiji_path (str): Path to Fiji executable
+        """
+        try:
+            cache_file = self._fiji_path_cache_file()
+            FileUtils.ensure_directory(cache_file.parent)
+            with open(cache_file, 'w') as f:
+                json.dump({"platform": self.config.platform, "path": str(fiji_path)}, f)
+        except OSError:
+            # The cache is only an optimization
+            pass
+    
     def _verify_thunderstorm_plugin(self):
         """
         Attempts to verify that ThunderSTORM plugin is available.
         This is a basic check - the actual verification happens when running the analysis.
         """
-        print("Note: Please ensure ThunderSTORM plugin is installed in Fiji:")
-        print("  Method 1: Help > Update... > Manage update sites")
-        print("  Method 2: Download .jar from GitHub and place in Fiji.app/plugins/")
+        if ThunderSTORMAutomator._plugin_notice_shown:
+            return
+        ThunderSTORMAutomator._plugin_notice_shown = True
+        
+        logger.info("Note: Please ensure ThunderSTORM plugin is installed in Fiji:\n"
+                    "  Method 1: Help > Update... > Manage update sites\n"
+                    "  Method 2: Download .jar from GitHub and place in Fiji.app/plugins/")
 
     def run_thunderstorm_analysis(self, input_path: str, output_dir: str,
+                                session: Optional['ThunderSTORMSession'] = None,
                                 **kwargs) -> bool:
         """
         Runs ThunderSTORM analysis on an input image using a generated ImageJ macro.
@@ -88,154 +378,317 @@ class ThunderSTORMAutomator:
         Args:
             input_path (str): Path to the input TIFF stack.
             output_dir (str): Directory to save the analysis results.
+            session (ThunderSTORMSession, optional): Running Fiji session to
+                execute the macro in, instead of starting a new Fiji process
             **kwargs: Additional parameters (see config for defaults)
             
         Returns:
             bool: True if analysis completed successfully, False otherwise
         """
-        # Get default parameters and update with kwargs
-        params = self.config.get_default_parameters().copy()
-        params.update(kwargs)
+        params, cmd = self._prepare_analysis(input_path, output_dir, kwargs)
+        timeout = self.config.get_analysis_timeout()
         
-        # Validate input file
-        if not Path(input_path).exists():
-            raise FileNotFoundError(f"Input file not found: {input_path}")
+        # Run the analysis
+        if session is not None:
+            logger.info("Running ThunderSTORM analysis in the Fiji session...")
+            returncode, stdout, stderr = session.run_macro(cmd[-1], timeout=timeout)
+        else:
+            logger.info("Running ThunderSTORM analysis via Fiji...")
+            logger.debug("Command: %s <macro>", _CommandLine(cmd[:-1]))
+            returncode, stdout, stderr = ProcessUtils.run_command(cmd, timeout=timeout, stream=True)
         
-        # Validate TIFF file
-        if not ImageUtils.validate_tiff_file(input_path):
-            print(f"Warning: {input_path} may not be a valid TIFF file")
+        # Process results (Fiji's output was already shown while it ran)
+        success = self._process_analysis_results(returncode, stdout, stderr, output_dir, params,
+                                                  output_shown=True)
         
-        # Create output directory if it doesn't exist
-        FileUtils.ensure_directory(output_dir)
+        return success
+    
+    def run_thunderstorm_batch(self, input_paths: List[str], output_dirs: List[str],
+                               max_concurrency: Optional[int] = None,
+                               **kwargs) -> List[bool]:
+        """
+        Runs ThunderSTORM analysis on several input images concurrently.
+        
+        Each input is analyzed by its own headless Fiji process; at most
+        max_concurrency processes run at the same time.
 
-        # Sanitize paths for the ImageJ macro (must use forward slashes)
-        sanitized_input_path = FileUtils.sanitize_path(input_path)
-        sanitized_output_dir = FileUtils.sanitize_path(output_dir)
+        Args:
+            input_paths (List[str]): Paths to the input TIFF stacks.
+            output_dirs (List[str]): Output directory for each input.
+            max_concurrency (int, optional): Maximum number of concurrent Fiji
+                processes (defaults to the number of CPUs)
+            **kwargs: Additional parameters applied to every input (see config for defaults)
+            
+        Returns:
+            List[bool]: Success of each analysis, in input order
+        """
+        if len(input_paths) != len(output_dirs):
+            raise ValueError("input_paths and output_dirs must have the same length")
+        
+        max_concurrency = max_concurrency or os.cpu_count() or 1
+        return ProcessUtils.run_coroutine(
+            self._run_batch(input_paths, output_dirs, max_concurrency, kwargs))
+    
+    async def _run_batch(self, input_paths: List[str], output_dirs: List[str],
+                         max_concurrency: int, kwargs: Dict[str, Any]) -> List[bool]:
+        """
+        Run all batch analyses, limited by a semaphore.
+        
+        Returns:
+            List[bool]: Success of each analysis, in input order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        return await asyncio.gather(*[
+            self._run_one_async(input_path, output_dir, semaphore, kwargs)
+            for input_path, output_dir in zip(input_paths, output_dirs)
+        ])
+    
+    async def _run_one_async(self, input_path: str, output_dir: str,
+                             semaphore: asyncio.Semaphore, kwargs: Dict[str, Any]) -> bool:
+        """
+        Run a single analysis of a batch.
+        
+        Returns:
+            bool: True if analysis completed successfully, False otherwise
+        """
+        async with semaphore:
+            try:
+                params, cmd = await asyncio.to_thread(
+                    self._prepare_analysis, input_path, output_dir, kwargs)
+            except Exception as e:
+                logger.error("Error preparing analysis of %s: %s", input_path, e)
+                return False
+            
+            logger.info("Running ThunderSTORM analysis of %s via Fiji...", input_path)
+            timeout = self.config.get_analysis_timeout()
+            returncode, stdout, stderr = await ProcessUtils.run_command_async(cmd, timeout=timeout)
+        
+        return self._process_analysis_results(returncode, stdout, stderr, output_dir, params)
+    
+    def run_thunderstorm_batch_single_jvm(self, jobs: List[Tuple[str, str]],
+                                          **kwargs) -> List[bool]:
+        """
+        Runs ThunderSTORM analysis on several input images in one Fiji process.
+        
+        A single macro loops over all inputs, so the Fiji/JVM startup cost is
+        paid once rather than per file.
+
+        Args:
+            jobs (List[Tuple[str, str]]): (input_path, output_dir) pairs
+            **kwargs: Additional parameters applied to every input (see config for defaults)
+            
+        Returns:
+            List[bool]: Success of each analysis, in job order
+        """
+        params = {**self.config.get_default_parameters(), **kwargs}
+        
+        # Inputs that fail validation are reported and left out of the macro
+        prepared: List[Optional[JobPaths]] = []
+        for input_path, output_dir in jobs:
+            try:
+                prepared.append(self._prepare_paths(input_path, output_dir))
+            except OSError as e:
+                logger.error("Error preparing analysis of %s: %s", input_path, e)
+                prepared.append(None)
+        
+        valid_jobs = [paths for paths in prepared if paths is not None]
+        if not valid_jobs:
+            return [False] * len(jobs)
+        
+        # One macro serves every file, so one debug copy is enough
+        macro_script = self._generate_batch_macro(valid_jobs, params)
+        if params.get('save_macro', False):
+            self._save_macro(valid_jobs[0].output_raw, macro_script)
+        
+        cmd = self._build_command(macro_script)
+        logger.info("Running ThunderSTORM analysis of %d files in one Fiji process...", len(valid_jobs))
+        logger.debug("Command: %s <macro>", _CommandLine(cmd[:-1]))
+        
+        # Allow the configured per-file timeout for each file in the batch
+        timeout = self.config.get_analysis_timeout() * len(valid_jobs)
+        returncode, stdout, stderr = ProcessUtils.run_command(cmd, timeout=timeout, stream=True)
+        
+        # Fiji's exit code covers the whole batch; each file is judged by the
+        # marker the macro printed for it (Fiji's output was already shown)
+        if returncode != 0:
+            self._process_analysis_results(returncode, stdout, stderr, "", params,
+                                           output_shown=True)
+        done = self._batch_markers(stdout, _BATCH_FILE_DONE)
+        failed = self._batch_markers(stdout, _BATCH_FILE_FAIL)
+        
+        results = []
+        index = iter(range(len(valid_jobs)))
+        for paths in prepared:
+            if paths is None:
+                results.append(False)
+                continue
+            i = next(index)
+            success = (i in done and i not in failed and
+                       (Path(paths.output_raw) / "results.csv").exists())
+            if success:
+                logger.info("Analysis complete! Results saved in: %s", paths.output_raw)
+                self._verify_output_files(paths.output_raw, params)
+            else:
+                logger.error("ThunderSTORM analysis of %s failed", paths.input_raw)
+            results.append(success)
+        
+        return results
+    
+    @staticmethod
+    def _batch_markers(stdout: str, marker: str) -> set:
+        """
+        Collect the input indices a batch macro printed after a marker.
+        
+        Args:
+            stdout (str): Standard output from Fiji
+            marker (str): Marker preceding each index
+            
+        Returns:
+            set: Indices of the inputs reported with the marker
+        """
+        indices = set()
+        for line in stdout.splitlines():
+            if line.startswith(marker):
+                try:
+                    indices.add(int(float(line[len(marker):])))
+                except ValueError:
+                    pass
+        return indices
+    
+    def _prepare_analysis(self, input_path: str, output_dir: str,
+                          kwargs: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Validate the input, write the analysis macro and build the Fiji command.
+        
+        Args:
+            input_path (str): Path to the input TIFF stack.
+            output_dir (str): Directory to save the analysis results.
+            kwargs (Dict[str, Any]): Parameters overriding the config defaults
+            
+        Returns:
+            Tuple[Dict[str, Any], List[str]]: Analysis parameters and Fiji command
+        """
+        # Overlay kwargs on the default parameters
+        params = {**self.config.get_default_parameters(), **kwargs}
+        
+        paths = self._prepare_paths(input_path, output_dir)
 
         # Generate the ImageJ macro script
-        macro_script = self._generate_macro(sanitized_input_path, sanitized_output_dir, params)
+        macro_script = self._generate_macro(paths, params)
+
+        # Fiji evaluates the macro from the command line; the file copy is
+        # only kept for debugging
+        if params.get('save_macro', False):
+            self._save_macro(output_dir, macro_script)
+
+        return params, self._build_command(macro_script)
+    
+    def _prepare_paths(self, input_path: str, output_dir: str) -> JobPaths:
+        """
+        Validate an input file and create its output directory.
+        
+        Args:
+            input_path (str): Path to the input TIFF stack.
+            output_dir (str): Directory to save the analysis results.
+            
+        Returns:
+            JobPaths: Raw paths and their forms sanitized for ImageJ macros
+        """
+        # Validate TIFF file; only stat it separately if validation fails
+        if not ImageUtils.validate_tiff_file(input_path):
+            if not Path(input_path).exists():
+                raise FileNotFoundError(f"Input file not found: {input_path}")
+            logger.warning("%s may not be a valid TIFF file", input_path)
+        
+        # Create output directory if it doesn't exist
+        FileUtils.ensure_directory(output_dir)
 
-        # Save the generated macro to a file
+        # Sanitize paths for the ImageJ macro (must use forward slashes) once
+        return JobPaths(str(input_path), FileUtils.sanitize_path(input_path),
+                        str(output_dir), FileUtils.sanitize_path(output_dir))
+    
+    def _save_macro(self, output_dir: str, macro_script: str):
+        """
+        Save a generated macro to the output directory for debugging.
+        
+        Args:
+            output_dir (str): Output directory path
+            macro_script (str): Generated macro script
+        """
         macro_path = Path(output_dir) / "thunderstorm_macro.ijm"
         try:
-            with open(macro_path, 'w') as f:
-                f.write(macro_script)
-            print(f"Generated macro saved to: {macro_path}")
+            FileUtils.write_file(macro_path, macro_script)
+            logger.info("Generated macro saved to: %s", macro_path)
         except Exception as e:
-            print(f"Error saving macro file: {e}")
-            raise
-
-        # Construct and run the command-line call to Fiji
-        cmd = [
+            logger.warning("Could not save macro file: %s", e)
+    
+    def _build_command(self, macro_script: str) -> List[str]:
+        """
+        Construct the command-line call to Fiji for a macro.
+        
+        Args:
+            macro_script (str): Macro to evaluate
+            
+        Returns:
+            List[str]: Fiji command
+        """
+        return [
             str(self.fiji_path),
             '--headless',  # Run Fiji without the graphical user interface
             '--console',   # Enable console output
-            '--run', str(macro_path)
+            '-eval', macro_script
         ]
-
-        print("Running ThunderSTORM analysis via Fiji...")
-        print(f"Command: {' '.join(cmd)}")
-        
-        # Run the analysis
-        timeout = self.config.get_analysis_timeout()
-        returncode, stdout, stderr = ProcessUtils.run_command(cmd, timeout=timeout)
-        
-        # Process results
-        success = self._process_analysis_results(returncode, stdout, stderr, output_dir, params)
-        
-        return success
     
-    def _generate_macro(self, input_path: str, output_dir: str, params: Dict[str, Any]) -> str:
+    def _generate_macro(self, paths: JobPaths, params: Dict[str, Any]) -> str:
         """
         Generate the ImageJ macro script for ThunderSTORM analysis.
         
         Args:
-            input_path (str): Sanitized input file path
-            output_dir (str): Sanitized output directory path
+            paths (JobPaths): Input and output paths of the analysis
             params (Dict[str, Any]): Analysis parameters
             
         Returns:
             str: Generated macro script
         """
-        # Prepare the ImageJ macro script
-        macro_script = f"""
-        // ThunderSTORM Analysis Macro
-        print("Starting ThunderSTORM analysis...");
-        
-        // Open the input image
-        open("{input_path}");
-        print("Opened input file: {input_path}");
-        
-        // Ensure the image is selected
-        if (nImages == 0) {{
-            print("Error: No images are open!");
-            exit();
-        }}
-        
-        // Run ThunderSTORM analysis
-        // The plugin should be accessible via the Plugins menu
-        run("Run analysis",
-            "filter='{params['processing_method']}' " +
-            "detector='[Local maximum]' " +
-            "estimator='{params['localization_method']}' " +
-            "sigma={params['sigma']} " +
-            "fitradius={params['fitting_radius']} " +
-            "method='[Weighted Least squares]' " +
-            "camera.gain={params['gain']} " +
-            "camera.offset={params['offset']} " +
-            "camera.pixelsize={params['pixel_size']}");
-        
-        print("ThunderSTORM analysis completed.");
-        
-        // Export the localization results to a CSV file
-        run("Export results", 
-            "filepath='{output_dir}/results.csv' " +
-            "fileformat=[CSV (comma separated)] " +
-            "x=true y=true sigma=true intensity=true offset=true " +
-            "bkgstd=true uncertainty=true saveprotocol=true");
-        
-        print("Results exported to: {output_dir}/results.csv");
-        """
-
         # Add super-resolution image creation if requested
         if params.get('create_reconstructed_image', True):
-            macro_script += f"""
-        
-        // Create and save super-resolved image
-        run("Visualization",
-            "imleft=0.0 imtop=0.0 imwidth=512.0 imheight=512.0 " +
-            "renderer='[Averaged shifted histograms]' " +
-            "magnification=5.0 " +
-            "colorizez=false " +
-            "threed=false " +
-            "shifts=2 " +
-            "repaint=50");
+            template = _MACRO_TEMPLATE_WITH_RECON
+        else:
+            template = _MACRO_TEMPLATE_WITHOUT_RECON
         
-        if (nImages > 1) {{
-            // Find and save the reconstructed image
-            for (i = 1; i <= nImages; i++) {{
-                selectImage(i);
-                title = getTitle();
-                if (indexOf(title, "Reconstructed") >= 0 || indexOf(title, "Visualization") >= 0) {{
-                    saveAs("Tiff", "{output_dir}/reconstructed_image.tif");
-                    print("Super-resolved image saved: {output_dir}/reconstructed_image.tif");
-                    break;
-                }}
-            }}
-        }}
+        try:
+            key = tuple(sorted((name, type(value), value) for name, value in params.items()))
+            return _render_macro(template, key, paths.input_fwd, paths.output_fwd)
+        except TypeError:
+            # Unhashable parameter values cannot be cached
+            return template.substitute(params, input_path=paths.input_fwd,
+                                       output_dir=paths.output_fwd)
+    
+    def _generate_batch_macro(self, jobs: List[JobPaths], params: Dict[str, Any]) -> str:
         """
-
-        macro_script += """
+        Generate an ImageJ macro that analyzes several files in a loop.
         
-        // Close all windows to allow Fiji to exit cleanly
-        run("Close All");
-        print("Analysis complete. All windows closed.");
+        Args:
+            jobs (List[JobPaths]): Input and output paths of each analysis
+            params (Dict[str, Any]): Analysis parameters
+            
+        Returns:
+            str: Generated macro script
         """
+        if params.get('create_reconstructed_image', True):
+            template = _BATCH_MACRO_TEMPLATE_WITH_RECON
+        else:
+            template = _BATCH_MACRO_TEMPLATE_WITHOUT_RECON
         
-        return macro_script
+        return template.substitute(
+            params,
+            input_paths=", ".join(_macro_string(job.input_fwd) for job in jobs),
+            output_dirs=", ".join(_macro_string(job.output_fwd) for job in jobs)
+        )
     
     def _process_analysis_results(self, returncode: int, stdout: str, stderr: str, 
-                                output_dir: str, params: Dict[str, Any]) -> bool:
+                                output_dir: str, params: Dict[str, Any],
+                                output_shown: bool = False) -> bool:
         """
         Process the results of the ThunderSTORM analysis.
         
@@ -245,39 +698,40 @@ class ThunderSTORMAutomator:
             stderr (str): Standard error from Fiji
             output_dir (str): Output directory path
             params (Dict[str, Any]): Analysis parameters
+            output_shown (bool): Whether Fiji's output was already streamed
             
         Returns:
             bool: True if analysis was successful, False otherwise
         """
+        if output_shown:
+            stdout = stderr = ""
+        
         if returncode == 0:
             if stdout:
-                print("Fiji stdout:")
-                print(stdout)
+                logger.info("Fiji stdout:\n%s", stdout)
             
             if stderr:
-                print("Fiji stderr:")
-                print(stderr)
+                logger.info("Fiji stderr:\n%s", stderr)
             
-            print(f"Analysis complete! Results saved in: {output_dir}")
+            logger.info("Analysis complete! Results saved in: %s", output_dir)
             
             # Check if expected output files were created
             self._verify_output_files(output_dir, params)
             return True
             
         elif returncode == -1:
-            print("Error: Fiji process timed out or failed to run")
+            logger.error("Fiji process timed out or failed to run")
             return False
         else:
-            print(f"Error running ThunderSTORM analysis:")
-            print(f"Return Code: {returncode}")
+            logger.error("Error running ThunderSTORM analysis (return code %s)", returncode)
             if stdout:
-                print(f"Stdout: {stdout}")
+                logger.error("Stdout: %s", stdout)
             if stderr:
-                print(f"Stderr: {stderr}")
-            print("\nTroubleshooting tips:")
-            print("1. Ensure ThunderSTORM plugin is properly installed")
-            print("2. Check that the input file is a valid TIFF stack")
-            print("3. Verify Fiji can run in headless mode")
+                logger.error("Stderr: %s", stderr)
+            logger.info("Troubleshooting tips:\n"
+                        "1. Ensure ThunderSTORM plugin is properly installed\n"
+                        "2. Check that the input file is a valid TIFF stack\n"
+                        "3. Verify Fiji can run in headless mode")
             return False
     
     def _verify_output_files(self, output_dir: str, params: Dict[str, Any]):
@@ -294,46 +748,44 @@ class ThunderSTORMAutomator:
             # Check for results CSV
             results_file = output_path / "results.csv"
             if results_file.exists():
-                print(f"✓ Localization results: {results_file}")
+                logger.info("✓ Localization results: %s", results_file)
                 
                 # Try to get some basic stats about the results
                 try:
-                    with open(results_file, 'r') as f:
-                        lines = f.readlines()
-                        if len(lines) > 1:  # Header + at least one data row
-                            print(f"  Found {len(lines) - 1} localizations")
-                        else:
-                            print("  Warning: No localizations found in results")
+                    n_lines = FileUtils.count_lines(results_file)
+                    if n_lines > 1:  # Header + at least one data row
+                        logger.info("  Found %d localizations", n_lines - 1)
+                    else:
+                        logger.warning("  No localizations found in results")
                 except Exception as e:
-                    print(f"  Could not read results file: {e}")
+                    logger.warning("  Could not read results file: %s", e)
             else:
-                print("⚠ Warning: Expected results.csv file not found")
+                logger.warning("⚠ Expected results.csv file not found")
             
             # Check for reconstructed image if requested
             if params.get('create_reconstructed_image', True):
                 reconstructed_file = output_path / "reconstructed_image.tif"
                 if reconstructed_file.exists():
-                    print(f"✓ Super-resolved image: {reconstructed_file}")
+                    logger.info("✓ Super-resolved image: %s", reconstructed_file)
                     
-                    # Get image info with error handling
-                    try:
-                        img_info = ImageUtils.get_image_info(reconstructed_file)
-                        if 'width' in img_info and 'height' in img_info:
-                            print(f"  Image size: {img_info['width']}x{img_info['height']} pixels")
-                    except Exception as e:
-                        print(f"  Could not get image info: {e}")
+                    # Opening a large reconstruction is only worth it when asked for
+                    if params.get('verbose_verification', False):
+                        try:
+                            img_info = ImageUtils.get_image_info(reconstructed_file)
+                            if 'width' in img_info and 'height' in img_info:
+                                logger.info("  Image size: %sx%s pixels", img_info['width'], img_info['height'])
+                        except Exception as e:
+                            logger.warning("  Could not get image info: %s", e)
                 else:
-                    print("⚠ Warning: Expected reconstructed_image.tif file not found")
+                    logger.warning("⚠ Expected reconstructed_image.tif file not found")
             
             # Check for macro file
             macro_file = output_path / "thunderstorm_macro.ijm"
             if macro_file.exists():
-                print(f"✓ Macro file: {macro_file}")
-            
-            print(f"Macro file retained for debugging: {macro_file}")
+                logger.info("✓ Macro file (retained for debugging): %s", macro_file)
         except Exception as e:
-            print(f"Error during output file verification: {e}")
-            print("Some output files may not have been created correctly")
+            logger.error("Error during output file verification: %s", e)
+            logger.error("Some output files may not have been created correctly")
 
     def test_fiji_installation(self) -> bool:
         """
@@ -342,7 +794,7 @@ class ThunderSTORMAutomator:
         Returns:
             bool: True if Fiji is working, False otherwise
         """
-        print("Testing Fiji installation...")
+        logger.info("Testing Fiji installation...")
         
         # Simple test macro
         test_macro = """
@@ -350,41 +802,25 @@ class ThunderSTORMAutomator:
         print("ImageJ version: " + getVersion());
         """
         
-        # Create a temporary macro file
-        temp_dir = Path.cwd() / "temp_test"
-        FileUtils.ensure_directory(temp_dir)
-        macro_path = temp_dir / "test_macro.ijm"
-        
         try:
-            with open(macro_path, 'w') as f:
-                f.write(test_macro)
-            
-            cmd = [str(self.fiji_path), '--headless', '--console', '--run', str(macro_path)]
-            
+            # Pass the macro on the command line, like the analysis macro
+            cmd = self._build_command(test_macro)
             returncode, stdout, stderr = ProcessUtils.run_command(cmd, timeout=30)
             
             if returncode == 0:
-                print("✓ Fiji installation test passed")
+                logger.info("✓ Fiji installation test passed")
                 if stdout:
-                    print("Fiji output:", stdout)
+                    logger.info("Fiji output: %s", stdout)
                 return True
             else:
-                print("✗ Fiji installation test failed")
+                logger.error("✗ Fiji installation test failed")
                 if stderr:
-                    print("Error output:", stderr)
+                    logger.error("Error output: %s", stderr)
                 return False
                 
         except Exception as e:
-            print(f"✗ Fiji installation test failed: {e}")
+            logger.error("✗ Fiji installation test failed: %s", e)
             return False
-        finally:
-            # Clean up
-            try:
-                FileUtils.remove_file(macro_path)
-                if temp_dir.exists():
-                    temp_dir.rmdir()
-            except Exception as e:
-                print(f"Warning: Could not clean up temporary files: {e}")
 
     def get_image_info(self, image_path: str) -> Dict[str, Any]:
         """
@@ -398,48 +834,203 @@ class ThunderSTORMAutomator:
         """
         return ImageUtils.get_image_info(image_path)
     
-    def validate_input_file(self, image_path: str) -> bool:
+    def validate_input_file(self, image_path: str,
+                            prefetched_info: Optional[Dict[str, Any]] = None) -> bool:
         """
         Validate that an input file is suitable for ThunderSTORM analysis.
         
         Args:
             image_path (str): Path to the image file
+            prefetched_info (Dict[str, Any], optional): Information already
+                read with ImageUtils.get_image_info; it is checked in place
+                of reading the file again
             
         Returns:
             bool: True if file is valid, False otherwise
         """
-        if not Path(image_path).exists():
-            print(f"✗ Input file does not exist: {image_path}")
-            return False
+        # Extension, size and header come from one stat and one open; only the
+        # TIFF directories are read, not the pixel data (memoized per file)
+        img_info = prefetched_info if prefetched_info is not None else ImageUtils.get_image_info(image_path)
         
-        if not ImageUtils.validate_tiff_file(image_path):
-            print(f"✗ Input file is not a valid TIFF: {image_path}")
+        is_valid = img_info.get('valid_tiff', False)
+        
+        if not img_info.get('exists', False):
+            logger.error("✗ Input file does not exist: %s", image_path)
             return False
         
-        img_info = ImageUtils.get_image_info(image_path)
+        if not is_valid:
+            logger.error("✗ Input file is not a valid TIFF: %s", image_path)
+            return False
         
         if img_info.get('size_bytes', 0) == 0:
-            print(f"✗ Input file is empty: {image_path}")
+            logger.error("✗ Input file is empty: %s", image_path)
             return False
         
-        if 'width' in img_info and 'height' in img_info:
-            if img_info['width'] < 10 or img_info['height'] < 10:
-                print(f"✗ Input image is too small: {img_info['width']}x{img_info['height']}")
-                return False
+        # Every TIFF stores its size, so a missing size means a damaged header
+        if 'width' not in img_info or 'height' not in img_info:
+            logger.error("✗ Could not read the image size: %s", image_path)
+            return False
+        
+        if img_info['width'] < 10 or img_info['height'] < 10:
+            logger.error("✗ Input image is too small: %sx%s", img_info['width'], img_info['height'])
+            return False
         
-        print(f"✓ Input file validation passed: {image_path}")
-        if 'width' in img_info:
-            print(f"  Image size: {img_info['width']}x{img_info['height']} pixels")
+        logger.info("✓ Input file validation passed: %s", image_path)
+        logger.info("  Image size: %sx%s pixels", img_info['width'], img_info['height'])
         if 'n_frames' in img_info:
-            print(f"  Number of frames: {img_info['n_frames']}")
+            logger.info("  Number of frames: %s", img_info['n_frames'])
         
         return True
 
 
+class ThunderSTORMSession:
+    """
+    A long-lived headless Fiji process that runs macros sent to its stdin.
+    
+    Fiji and its JVM start once, when the session starts; every analysis
+    run through the session then only pays for executing its macro::
+    
+        with ThunderSTORMSession(automator) as session:
+            automator.run_thunderstorm_analysis(input_path, output_dir, session=session)
+    """
+    
+    def __init__(self, fiji: Union[ThunderSTORMAutomator, str, Path]):
+        """
+        Initialize the session.
+        
+        Args:
+            fiji (Union[ThunderSTORMAutomator, str, Path]): Automator whose Fiji
+                executable is used, or the path to a Fiji executable
+        """
+        self.fiji_path = fiji.fiji_path if isinstance(fiji, ThunderSTORMAutomator) else fiji
+        self.proc = None
+        self._script_path = None
+        self._lines = None
+    
+    def __enter__(self) -> 'ThunderSTORMSession':
+        self.start()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    @property
+    def running(self) -> bool:
+        """bool: Whether the Fiji process is running."""
+        return self.proc is not None and self.proc.poll() is None
+    
+    def start(self):
+        """
+        Start the Fiji process with the BeanShell macro loop.
+        """
+        if self.running:
+            return
+        
+        fd, self._script_path = tempfile.mkstemp(prefix="thunderstorm_session_", suffix=".bsh")
+        with os.fdopen(fd, 'w') as f:
+            f.write(_SESSION_BOOTSTRAP)
+        
+        # stderr is merged into stdout so a single reader can drain both
+        self.proc = subprocess.Popen(
+            [str(self.fiji_path), '--headless', '--console', '--run', self._script_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_output, args=(self.proc.stdout, self._lines),
+                         daemon=True).start()
+        logger.info("Started Fiji session")
+    
+    @staticmethod
+    def _read_output(stdout, lines: queue.Queue):
+        """Forward Fiji's output lines to the queue; None marks the end."""
+        for line in stdout:
+            lines.put(line)
+        lines.put(None)
+    
+    def run_macro(self, macro_script: str, timeout: Optional[int] = None,
+                  echo: bool = True) -> Tuple[int, str, str]:
+        """
+        Run a macro in the session.
+        
+        Args:
+            macro_script (str): ImageJ macro to run
+            timeout (int, optional): Timeout in seconds
+            echo (bool): Whether to print Fiji's output as it arrives
+            
+        Returns:
+            Tuple[int, str, str]: (return_code, stdout, stderr), as from
+            ProcessUtils.run_command; the session is closed on a timeout
+        """
+        if not self.running:
+            raise RuntimeError("Fiji session is not running")
+        
+        try:
+            self.proc.stdin.write(f"{macro_script.rstrip()}\n{_SESSION_END}\n")
+            self.proc.stdin.flush()
+        except OSError:
+            # Fiji exited after the running check (e.g. a broken pipe)
+            returncode = self.proc.poll()
+            self.close()
+            return returncode or 1, "", "Fiji session exited unexpectedly"
+        
+        output = []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if deadline is None:
+                    line = self._lines.get()
+                else:
+                    line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.close()
+                return -1, "".join(output), "Process timed out"
+            
+            if line is None:
+                return self.proc.wait() or 1, "".join(output), "Fiji session exited unexpectedly"
+            if line.startswith(_SESSION_DONE):
+                # IJ.runMacro() reports an aborted macro as "[aborted]"
+                aborted = line[len(_SESSION_DONE):].strip() == "[aborted]"
+                return (1 if aborted else 0), "".join(output), ""
+            
+            if echo:
+                print(line, end="")
+            output.append(line)
+    
+    def close(self, timeout: int = 30):
+        """
+        Ask the Fiji process to exit and wait for it, killing it if needed.
+        
+        Args:
+            timeout (int): Seconds to wait before killing the process
+        """
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                try:
+                    self.proc.stdin.write(f"{_SESSION_EXIT}\n")
+                    self.proc.stdin.close()
+                    self.proc.wait(timeout=timeout)
+                except (OSError, subprocess.TimeoutExpired):
+                    self.proc.kill()
+                    self.proc.wait()
+            self.proc = None
+            logger.info("Closed Fiji session")
+        
+        if self._script_path:
+            FileUtils.remove_file(self._script_path)
+            self._script_path = None
+
+
 def main():
     """
     Main function for running ThunderSTORM analysis from command line.
     """
+    # Show the automator's progress messages on the console
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    
     # Example usage - replace with actual file paths
     input_file = "/path/to/your/input.tif"
     output_folder = "/path/to/your/output"
@@ -480,7 +1071,6 @@ def main():
             print("Expected files:")
             print("  - results.csv: Localization data")
             print("  - reconstructed_image.tif: Super-resolved image")
-            print("  - thunderstorm_macro.ijm: Generated macro (for debugging)")
         else:
             print("Analysis failed. Check the error messages above.")
             sys.exit(1)
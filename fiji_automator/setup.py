@@ -6,31 +6,84 @@ Handles downloading and installing Fiji and ThunderSTORM plugin.
 
 import os
 import sys
+import argparse
+import atexit
+import shutil
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
-import urllib.request
+from typing import List, Optional
+import urllib.error
 import json
 
-from .config import get_config
+from .config import get_config, _loads
 from .utils import FileUtils, ProcessUtils
 
+# Seconds a cached GitHub release response is used without asking GitHub,
+# unless the response set its own Cache-Control max-age
+_RELEASE_CACHE_TTL = 3600
+
+# Seconds to wait at exit for old installations still being deleted
+_CLEANUP_JOIN_TIMEOUT = 5.0
+
+# Background threads deleting replaced Fiji installations
+_cleanup_threads: List[threading.Thread] = []
+
+
+def _start_cleanup(paths: List[Path]):
+    """Delete directories in a background thread."""
+    def remove_all():
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    thread = threading.Thread(target=remove_all, daemon=True,
+                              name=f"fiji-cleanup: {', '.join(map(str, paths))}")
+    thread.start()
+    _cleanup_threads.append(thread)
+
+
+def _join_cleanup_threads():
+    """Give background deletions a short chance to finish before exit."""
+    deadline = time.monotonic() + _CLEANUP_JOIN_TIMEOUT
+    for thread in _cleanup_threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            print(f"Warning: old Fiji installation not fully deleted "
+                  f"({thread.name.split(': ', 1)[-1]}); it will be removed on the next setup")
+
+
+atexit.register(_join_cleanup_threads)
+
+
+def _parse_max_age(cache_control: Optional[str]) -> Optional[int]:
+    """Get the max-age in seconds from a Cache-Control header, if present."""
+    for directive in (cache_control or "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "max-age" and value.isdigit():
+            return int(value)
+    return None
+
 
 class FijiSetup:
     """
     A class to automatically download and install Fiji and ThunderSTORM plugin.
     """
     
-    def __init__(self, install_dir: Optional[str] = None, config_file: Optional[str] = None):
+    def __init__(self, install_dir: Optional[str] = None, config_file: Optional[str] = None,
+                 force: bool = False):
         """
         Initialize the setup class.
         
         Args:
             install_dir (str, optional): Custom installation directory
             config_file (str, optional): Path to configuration file
+            force (bool): Reinstall Fiji and ThunderSTORM even if already installed
         """
         self.config = get_config(config_file)
         self.platform = self.config.platform
+        self.force = force
         
         # Set installation directory
         if install_dir:
@@ -40,6 +93,13 @@ class FijiSetup:
         
         self.fiji_dir = self.install_dir / "Fiji.app"
         self.plugins_dir = self.fiji_dir / "plugins"
+        self._fiji_executable = self._compute_fiji_executable()
+        
+        # Fiji process kept running between execution tests
+        self._session = None
+        
+        # Installed ThunderSTORM jars, cached until the installation changes
+        self._ts_jars_cache: Optional[List[Path]] = None
     
     def check_permissions(self) -> bool:
         """
@@ -50,10 +110,14 @@ class FijiSetup:
         """
         return FileUtils.check_permissions(self.install_dir)
     
-    def download_fiji(self) -> bool:
+    def download_fiji(self, reinstall: Optional[bool] = None) -> bool:
         """
         Download and install Fiji for the current platform.
         
+        Args:
+            reinstall (bool, optional): Whether to replace an existing
+                installation (defaults to the force setting)
+        
         Returns:
             bool: True if successful, False otherwise
         """
@@ -61,18 +125,18 @@ class FijiSetup:
         
         # Check if Fiji is already installed
         if self.fiji_dir.exists():
-            print(f"Fiji already exists at {self.fiji_dir}")
-            response = input("Do you want to reinstall? (y/N): ").lower()
-            if response != 'y':
+            if reinstall is None:
+                reinstall = self.force
+            if not reinstall:
+                print(f"Fiji already exists at {self.fiji_dir} (use force to reinstall)")
                 return True
             else:
                 print("Removing existing Fiji installation...")
-                import shutil
-                shutil.rmtree(self.fiji_dir)
+                self._ts_jars_cache = None
+                self._remove_fiji_dir()
         
         # Get download URL for current platform
-        fiji_urls = self.config.get_fiji_urls()
-        download_url = fiji_urls.get(self.platform)
+        download_url = self.config.get_fiji_url(self.platform)
         
         if not download_url:
             print(f"✗ Unsupported platform: {self.platform}")
@@ -85,10 +149,12 @@ class FijiSetup:
             archive_path = temp_path / archive_name
             
             # Download Fiji
-            if not FileUtils.download_file(download_url, archive_path, "Fiji"):
+            if not FileUtils.download_file(download_url, archive_path, "Fiji",
+                                           sha256=self.config.get_fiji_sha256(self.platform)):
                 return False
             
             # Extract Fiji
+            self._ts_jars_cache = None
             if not FileUtils.extract_archive(archive_path, self.install_dir, "Fiji"):
                 return False
         
@@ -105,13 +171,64 @@ class FijiSetup:
             print("✗ Fiji installation failed - directory not found")
             return False
     
+    def _remove_fiji_dir(self):
+        """
+        Move the Fiji installation out of the way and delete it in the background.
+        
+        Renaming is a single metadata update, so the new download can start
+        right away instead of waiting for thousands of files to be unlinked.
+        """
+        old_dir = self.fiji_dir.parent / f"{self.fiji_dir.name}.old.{os.getpid()}"
+        try:
+            if old_dir.exists():
+                shutil.rmtree(old_dir, ignore_errors=True)
+            os.rename(self.fiji_dir, old_dir)
+        except OSError:
+            # e.g. files held open on Windows; delete in place instead
+            shutil.rmtree(self.fiji_dir)
+            return
+        
+        _start_cleanup([old_dir] + self._stale_fiji_dirs(exclude=old_dir))
+    
+    def _stale_fiji_dirs(self, exclude: Optional[Path] = None) -> List[Path]:
+        """
+        Find replaced Fiji installations left behind by earlier runs.
+        
+        Args:
+            exclude (Path, optional): Directory to leave out of the result
+        
+        Returns:
+            list: Leftover Fiji.app.old.* directories next to the installation
+        """
+        try:
+            with os.scandir(self.fiji_dir.parent) as entries:
+                return [Path(entry.path) for entry in entries
+                        if entry.name.startswith(f"{self.fiji_dir.name}.old.")
+                        and entry.is_dir(follow_symlinks=False)
+                        and (exclude is None or entry.path != str(exclude))]
+        except OSError:
+            return []
+    
+    def _sweep_stale_fiji_dirs(self):
+        """
+        Delete leftovers of earlier reinstalls in the background.
+        
+        Exit only waits briefly for background deletions, so a large
+        installation can be left half deleted; finish the job here.
+        """
+        stale_dirs = self._stale_fiji_dirs()
+        if stale_dirs:
+            _start_cleanup(stale_dirs)
+    
     def _make_fiji_executable(self):
         """
         Make Fiji executable on Unix systems.
         """
         try:
             fiji_executable = self.get_fiji_executable()
-            if fiji_executable and fiji_executable.exists():
+            # Usually the archive already carried the executable bit
+            if fiji_executable and fiji_executable.exists() and \
+                    not os.access(fiji_executable, os.X_OK):
                 os.chmod(fiji_executable, 0o755)
                 print(f"✓ Made {fiji_executable} executable")
         except Exception as e:
@@ -127,25 +244,101 @@ class FijiSetup:
         api_url = self.config.get_thunderstorm_api_url()
         
         try:
-            with urllib.request.urlopen(api_url) as response:
-                data = json.loads(response.read().decode())
-                
-                # Look for the .jar file in assets
-                for asset in data.get("assets", []):
-                    if asset["name"].endswith(".jar") and "thunderstorm" in asset["name"].lower():
-                        return asset["browser_download_url"], asset["name"]
-                
-                print("✗ ThunderSTORM .jar file not found in latest release")
-                return None, None
+            data = self._fetch_release_info(api_url)
+            
+            # Look for the .jar file in assets
+            for asset in data.get("assets", []):
+                if asset["name"].endswith(".jar") and "thunderstorm" in asset["name"].lower():
+                    return asset["browser_download_url"], asset["name"]
+            
+            print("✗ ThunderSTORM .jar file not found in latest release")
+            return None, None
                 
         except Exception as e:
             print(f"✗ Failed to get ThunderSTORM release info: {e}")
             return None, None
     
-    def install_thunderstorm(self) -> bool:
+    def _release_cache_file(self) -> Path:
+        """Get the path of the file caching the GitHub release response."""
+        return Path(self.config.get_cache_dir()) / "thunderstorm_release.json"
+    
+    def _fetch_release_info(self, api_url: str) -> dict:
+        """
+        Get the latest release info, reusing a cached response when possible.
+        
+        A fresh cache entry is used as is; a stale one is revalidated with
+        a conditional request, so an unchanged release costs a 304 only.
+        
+        Args:
+            api_url (str): GitHub API URL of the latest release
+            
+        Returns:
+            dict: Release info with the asset names and download URLs
+        """
+        cached = None
+        try:
+            with open(self._release_cache_file(), 'r') as f:
+                cached = json.load(f)
+            if not isinstance(cached, dict) or cached.get("url") != api_url:
+                cached = None
+        except (OSError, ValueError):
+            pass
+        
+        if cached is not None:
+            max_age = cached.get("max_age", _RELEASE_CACHE_TTL)
+            if time.time() - cached.get("fetched_at", 0) < max_age:
+                return cached["data"]
+        
+        headers = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        
+        try:
+            with FileUtils.open_url(api_url, headers) as response:
+                release = _loads(response.read())
+                response_headers = response.headers
+            # Only the assets are used; keep the cache entry small
+            data = {"assets": [{"name": asset["name"],
+                                "browser_download_url": asset["browser_download_url"]}
+                               for asset in release.get("assets", [])]}
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or cached is None:
+                raise
+            data = cached["data"]
+            response_headers = e.headers
+        
+        max_age = _parse_max_age(response_headers.get("Cache-Control"))
+        entry = {
+            "url": api_url,
+            "fetched_at": time.time(),
+            "max_age": _RELEASE_CACHE_TTL if max_age is None else max_age,
+            "etag": response_headers.get("ETag") or (cached or {}).get("etag"),
+            "last_modified": (response_headers.get("Last-Modified") or
+                              (cached or {}).get("last_modified")),
+            "data": data
+        }
+        try:
+            cache_file = self._release_cache_file()
+            FileUtils.ensure_directory(cache_file.parent)
+            with open(cache_file, 'w') as f:
+                json.dump(entry, f)
+        except OSError:
+            # The cache is only an optimization
+            pass
+        
+        return data
+    
+    def install_thunderstorm(self, reinstall: Optional[bool] = None) -> bool:
         """
         Download and install ThunderSTORM plugin.
         
+        Args:
+            reinstall (bool, optional): Whether to replace an installed
+                plugin (defaults to the force setting)
+        
         Returns:
             bool: True if successful, False otherwise
         """
@@ -161,24 +354,90 @@ class FijiSetup:
             return False
         
         # Check if already installed
-        existing_jars = FileUtils.find_files(self.plugins_dir, "*thunderstorm*.jar")
+        existing_jars = self._ts_jars()
         if existing_jars:
-            print(f"ThunderSTORM plugin already exists: {existing_jars[0]}")
-            response = input("Do you want to reinstall? (y/N): ").lower()
-            if response != 'y':
+            if reinstall is None:
+                reinstall = self.force
+            if not reinstall:
+                print(f"ThunderSTORM plugin already exists: {existing_jars[0]} "
+                      "(use force to reinstall)")
                 return True
             else:
+                self._ts_jars_cache = None
                 for jar in existing_jars:
                     FileUtils.remove_file(jar)
         
         # Download ThunderSTORM
         jar_path = self.plugins_dir / jar_name
+        self._ts_jars_cache = None
         if FileUtils.download_file(download_url, jar_path, "ThunderSTORM plugin"):
             print(f"✓ ThunderSTORM plugin installed at {jar_path}")
             return True
         else:
             return False
     
+    def _ts_jars(self, force: bool = False) -> List[Path]:
+        """
+        Get the installed ThunderSTORM jars, listing the plugins directory once.
+        
+        Args:
+            force (bool): List the directory again even if a result is cached
+            
+        Returns:
+            List[Path]: Installed ThunderSTORM jars
+        """
+        if force or self._ts_jars_cache is None:
+            self._ts_jars_cache = FileUtils.find_files(self.plugins_dir, "*thunderstorm*.jar")
+        return self._ts_jars_cache
+    
+    def _download_thunderstorm_jar(self, dest_dir: Path) -> Optional[Path]:
+        """
+        Look up the latest ThunderSTORM release and download its jar.
+        
+        Args:
+            dest_dir (Path): Directory to download the jar into
+            
+        Returns:
+            Optional[Path]: Path to the downloaded jar, or None if failed
+        """
+        download_url, jar_name = self.get_thunderstorm_download_url()
+        if not download_url:
+            print("✗ Could not find ThunderSTORM download URL")
+            return None
+        
+        # Progress output is left to the Fiji download running alongside
+        jar_path = dest_dir / jar_name
+        if not FileUtils.download_file(download_url, jar_path, show_progress=False):
+            print("✗ Failed to download ThunderSTORM plugin")
+            return None
+        
+        print(f"✓ Downloaded ThunderSTORM plugin {jar_name}")
+        return jar_path
+    
+    def _install_thunderstorm_jar(self, jar_path: Path, old_jars: List[Path]) -> bool:
+        """
+        Move a downloaded ThunderSTORM jar into the plugins directory.
+        
+        Args:
+            jar_path (Path): Downloaded jar
+            old_jars (List[Path]): Previously installed jars to remove
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        self._ts_jars_cache = None
+        try:
+            FileUtils.ensure_directory(self.plugins_dir)
+            for jar in old_jars:
+                FileUtils.remove_file(jar)
+            installed = self.plugins_dir / jar_path.name
+            shutil.move(str(jar_path), str(installed))
+            print(f"✓ ThunderSTORM plugin installed at {installed}")
+            return True
+        except Exception as e:
+            print(f"✗ Failed to install ThunderSTORM plugin: {e}")
+            return False
+    
     def verify_installation(self) -> bool:
         """
         Verify that Fiji and ThunderSTORM are properly installed.
@@ -188,29 +447,29 @@ class FijiSetup:
         """
         print("\nVerifying installation...")
         
-        # Check Fiji directory
-        if not self.fiji_dir.exists():
-            print("✗ Fiji directory not found")
-            return False
-        
-        # Check Fiji executable
+        # Check Fiji executable; a single stat also covers the Fiji directory
         fiji_executable = self.get_fiji_executable()
-        if not fiji_executable or not fiji_executable.exists():
-            print("✗ Fiji executable not found")
+        try:
+            os.stat(fiji_executable)
+        except (TypeError, OSError):
+            if not self.fiji_dir.exists():
+                print("✗ Fiji directory not found")
+            else:
+                print("✗ Fiji executable not found")
             return False
         
         print(f"✓ Fiji executable found at {fiji_executable}")
         
         # Check ThunderSTORM plugin
-        thunderstorm_jars = FileUtils.find_files(self.plugins_dir, "*thunderstorm*.jar")
+        thunderstorm_jars = self._ts_jars()
         if not thunderstorm_jars:
             print("✗ ThunderSTORM plugin not found")
             return False
         
         print(f"✓ ThunderSTORM plugin found: {thunderstorm_jars[0]}")
         
-        # Test Fiji execution
-        return self.test_fiji_execution()
+        # Test Fiji execution (the executable was just checked)
+        return self.test_fiji_execution(checked_executable=fiji_executable)
     
     def get_fiji_executable(self) -> Optional[Path]:
         """
@@ -219,6 +478,15 @@ class FijiSetup:
         Returns:
             Optional[Path]: Path to Fiji executable, or None if not found
         """
+        return self._fiji_executable
+    
+    def _compute_fiji_executable(self) -> Optional[Path]:
+        """
+        Build the Fiji executable path for the current platform.
+        
+        Returns:
+            Optional[Path]: Path to Fiji executable, or None for unsupported platforms
+        """
         if self.platform == "windows":
             return self.fiji_dir / "ImageJ-win64.exe"
         elif self.platform == "darwin":
@@ -228,19 +496,32 @@ class FijiSetup:
         else:
             return None
     
-    def test_fiji_execution(self) -> bool:
+    def test_fiji_execution(self, checked_executable: Optional[Path] = None,
+                            reuse: bool = False) -> bool:
         """
         Test that Fiji can be executed.
         
+        By default Fiji is started for this test only and exits afterwards.
+        With reuse=True the test runs in a Fiji process that is kept running
+        for later tests; stop it with close(), or use FijiSetup as a context
+        manager.
+        
+        Args:
+            checked_executable (Path, optional): Fiji executable the caller has
+                already confirmed exists, to skip checking it again
+            reuse (bool): Run the test in a persistent Fiji process
+        
         Returns:
             bool: True if Fiji can run, False otherwise
         """
         print("Testing Fiji execution...")
         
-        fiji_executable = self.get_fiji_executable()
-        if not fiji_executable or not fiji_executable.exists():
-            print("✗ Fiji executable not found")
-            return False
+        fiji_executable = checked_executable
+        if fiji_executable is None:
+            fiji_executable = self.get_fiji_executable()
+            if not fiji_executable or not fiji_executable.exists():
+                print("✗ Fiji executable not found")
+                return False
         
         # Create a simple test macro
         test_macro = '''
@@ -248,14 +529,19 @@ class FijiSetup:
         print("ImageJ version: " + getVersion());
         '''
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.ijm', delete=False) as f:
-            f.write(test_macro)
-            macro_path = f.name
-        
         try:
-            # Run Fiji with the test macro
-            cmd = [str(fiji_executable), '--headless', '--console', '--run', macro_path]
-            returncode, stdout, stderr = ProcessUtils.run_command(cmd, timeout=30)
+            if reuse:
+                # Reuse the running Fiji process, so only the first test pays for startup
+                if self._session is None or not self._session.running:
+                    from .core import ThunderSTORMSession
+                    self._session = ThunderSTORMSession(fiji_executable)
+                    self._session.start()
+                
+                returncode, stdout, stderr = self._session.run_macro(test_macro, timeout=30,
+                                                                     echo=False)
+            else:
+                cmd = [str(fiji_executable), '--headless', '--console', '-eval', test_macro]
+                returncode, stdout, stderr = ProcessUtils.run_command(cmd, timeout=30)
             
             if returncode == 0:
                 print("✓ Fiji execution test passed")
@@ -271,12 +557,20 @@ class FijiSetup:
         except Exception as e:
             print(f"✗ Fiji execution test failed: {e}")
             return False
-        finally:
-            # Clean up test macro
-            try:
-                FileUtils.remove_file(macro_path)
-            except Exception as e:
-                print(f"Warning: Could not clean up test macro file: {e}")
+    
+    def close(self):
+        """
+        Stop the Fiji process kept running by test_fiji_execution(reuse=True), if any.
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+    
+    def __enter__(self) -> 'FijiSetup':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def setup_all(self) -> bool:
         """
@@ -297,16 +591,35 @@ class FijiSetup:
         
         # Create installation directory
         FileUtils.ensure_directory(self.install_dir)
-        
-        # Download and install Fiji
-        if not self.download_fiji():
-            print("✗ Fiji installation failed")
-            return False
-        
-        # Install ThunderSTORM plugin
-        if not self.install_thunderstorm():
-            print("✗ ThunderSTORM installation failed")
-            return False
+        self._sweep_stale_fiji_dirs()
+        
+        # Decide what to (re)install before starting any downloads
+        reinstall_fiji = self.fiji_dir.exists() and self.force
+        old_jars = []
+        if self.fiji_dir.exists() and not reinstall_fiji:
+            old_jars = self._ts_jars()
+        install_plugin = not old_jars or self.force
+        if not install_plugin:
+            print(f"ThunderSTORM plugin already exists: {old_jars[0]} (use force to reinstall)")
+        
+        # Fetch the ThunderSTORM release and jar while Fiji downloads and extracts
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                ThreadPoolExecutor(max_workers=2) as pool:
+            fiji_future = pool.submit(self.download_fiji, reinstall_fiji)
+            jar_future = None
+            if install_plugin:
+                jar_future = pool.submit(self._download_thunderstorm_jar, Path(temp_dir))
+            
+            if not fiji_future.result():
+                print("✗ Fiji installation failed")
+                return False
+            
+            # Install ThunderSTORM plugin
+            if jar_future is not None:
+                jar_path = jar_future.result()
+                if jar_path is None or not self._install_thunderstorm_jar(jar_path, old_jars):
+                    print("✗ ThunderSTORM installation failed")
+                    return False
         
         # Verify installation
         if not self.verify_installation():
@@ -327,17 +640,25 @@ def main():
     """
     Main function to run the setup process.
     """
+    parser = argparse.ArgumentParser(description="Install Fiji and the ThunderSTORM plugin.")
+    parser.add_argument("install_dir", nargs="?", help="Custom installation directory")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="Reinstall even if already installed "
+                             "(also enabled by FIJI_AUTOMATOR_FORCE=1)")
+    args = parser.parse_args()
+    
     print("Fiji and ThunderSTORM Automatic Setup")
     print("====================================")
     
     # Allow custom installation directory
-    install_dir = None
-    if len(sys.argv) > 1:
-        install_dir = sys.argv[1]
+    install_dir = args.install_dir
+    if install_dir:
         print(f"Using custom installation directory: {install_dir}")
     
+    force = args.force or os.environ.get("FIJI_AUTOMATOR_FORCE") == "1"
+    
     # Create setup instance and run
-    setup = FijiSetup(install_dir)
+    setup = FijiSetup(install_dir, force=force)
     success = setup.setup_all()
     
     if success:
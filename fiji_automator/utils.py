@@ -5,23 +5,66 @@ Contains helper functions for file operations, image processing, and other commo
 """
 
 import os
+import sys
+import asyncio
 import shutil
 import tempfile
+import contextlib
+import urllib.error
 import urllib.request
 import zipfile
 import tarfile
+import mmap
+import re
+import struct
+import fnmatch
+import functools
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional, Tuple, Union
-import json
-import platform
 import subprocess
 
+from .config import get_platform, _loads, _dumps
+
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
+# Buffer size for archive reads and extracted-file writes
+_IO_BUFSIZE = 262144
+
+# Chunk size for copying downloads and extracted archive members
+_COPY_BUFSIZE = 1 << 20
+
+# Largest test image stack generated in one array; bigger ones are written per frame
+_TEST_IMAGE_MAX_BUFFER = 64 << 20
+
+# First 4 bytes of TIFF and BigTIFF files: byte order mark followed by the
+# version number (42 or 43) in that byte order
+_TIFF_MAGIC = (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+')
+
+# IFD entries read for image information: tag -> info key
+_TIFF_TAGS = {256: 'width', 257: 'height', 258: 'bits_per_sample',
+              277: 'samples_per_pixel', 339: 'sample_format'}
+
+# Struct codes of the integer TIFF field types those tags use
+_TIFF_TYPES = {1: 'B', 3: 'H', 4: 'I', 16: 'Q'}
+
+# PIL image mode for (samples per pixel, bits per sample, sample format)
+_TIFF_MODES = {(1, 1, 1): '1', (1, 8, 1): 'L', (1, 16, 1): 'I;16',
+               (1, 32, 2): 'I', (1, 32, 3): 'F', (3, 8, 1): 'RGB', (4, 8, 1): 'RGBA'}
+
 
 class FileUtils:
     """
     Utility class for file operations.
     """
     
+    # urllib3 connection pool shared by all downloads, created on first use
+    _http = None
+    
     @staticmethod
     def ensure_directory(path: Union[str, Path]) -> Path:
         """
@@ -37,10 +80,55 @@ class FileUtils:
         path.mkdir(parents=True, exist_ok=True)
         return path
     
+    @staticmethod
+    @contextlib.contextmanager
+    def open_url(url: str, headers: Optional[dict] = None, timeout: float = 30):
+        """
+        Open a URL for streaming, reusing keep-alive connections when possible.
+        
+        With urllib3 installed, HTTP(S) requests share one connection pool,
+        so repeated requests to a host skip the TCP and TLS handshakes;
+        otherwise (and for other schemes) urllib is used.
+        
+        Args:
+            url (str): URL to open
+            headers (dict, optional): Request headers
+            timeout (float): Timeout in seconds
+            
+        Yields:
+            Response with read(), status and headers
+            
+        Raises:
+            urllib.error.HTTPError: If the server answers with an error or 304
+        """
+        if urllib3 is None or not url.startswith(('http://', 'https://')):
+            request = urllib.request.Request(url, headers=headers or {})
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                yield response
+            return
+        
+        if FileUtils._http is None:
+            FileUtils._http = urllib3.PoolManager(maxsize=4, retries=urllib3.Retry(3))
+        response = FileUtils._http.request('GET', url, headers=headers, timeout=timeout,
+                                           preload_content=False)
+        try:
+            # Redirects are followed, so any remaining 3xx is a 304
+            if response.status >= 300:
+                raise urllib.error.HTTPError(url, response.status, response.reason,
+                                             response.headers, None)
+            yield response
+        except BaseException:
+            # Don't return a half-read connection to the pool
+            response.close()
+            raise
+        else:
+            response.release_conn()
+    
     @staticmethod
     def download_file(url: str, dest_path: Union[str, Path], 
                      description: str = "file", 
-                     show_progress: bool = True) -> bool:
+                     show_progress: bool = True,
+                     sha256: Optional[str] = None) -> bool:
         """
         Download a file with optional progress indication.
         
@@ -49,23 +137,45 @@ class FileUtils:
             dest_path (Union[str, Path]): Destination path for the file
             description (str): Description of what's being downloaded
             show_progress (bool): Whether to show progress
+            sha256 (str, optional): Expected SHA-256 hex digest; the file is
+                hashed while it downloads and removed if it does not match
             
         Returns:
             bool: True if successful, False otherwise
         """
         dest_path = Path(dest_path)
+        hasher = hashlib.sha256() if sha256 else None
         
         if show_progress:
             print(f"Downloading {description} from {url}")
         
-        def progress_hook(block_num, block_size, total_size):
-            if show_progress and total_size > 0:
-                percent = min(100, (block_num * block_size * 100) // total_size)
-                print(f"\rProgress: {percent}%", end="", flush=True)
-        
         try:
-            urllib.request.urlretrieve(url, dest_path, 
-                                     reporthook=progress_hook if show_progress else None)
+            with FileUtils.open_url(url, {'Accept-Encoding': 'identity'}) as response, \
+                    open(dest_path, 'wb', buffering=_COPY_BUFSIZE) as f:
+                total_size = int(response.headers.get('Content-Length') or 0)
+                downloaded = 0
+                n_chunks = 0
+                while True:
+                    chunk = response.read(_COPY_BUFSIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+                    downloaded += len(chunk)
+                    n_chunks += 1
+                    # Report progress every 8 chunks rather than on every read
+                    if show_progress and total_size > 0 and (n_chunks & 7) == 0:
+                        percent = min(100, downloaded * 100 // total_size)
+                        print(f"\rProgress: {percent}%", end="", flush=True)
+            if show_progress and total_size > 0:
+                print("\rProgress: 100%", end="")
+            if hasher is not None and hasher.hexdigest() != sha256.lower():
+                dest_path.unlink()
+                if show_progress:
+                    print(f"\n✗ Checksum mismatch for {description}: "
+                          f"expected {sha256}, got {hasher.hexdigest()}")
+                return False
             if show_progress:
                 print(f"\n✓ Downloaded {description} successfully")
             return True
@@ -96,10 +206,13 @@ class FileUtils:
         
         try:
             if archive_path.suffix.lower() == '.zip':
-                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
-                    zip_ref.extractall(extract_to)
+                with open(archive_path, 'rb', buffering=_IO_BUFSIZE) as fp, \
+                        zipfile.ZipFile(fp, 'r') as zip_ref:
+                    FileUtils._extract_zip_members(zip_ref, extract_to)
             elif archive_path.suffix.lower() in ['.tar', '.tgz', '.tar.gz']:
-                with tarfile.open(archive_path, 'r:*') as tar_ref:
+                # Stream mode reads the archive front to back in one pass
+                with open(archive_path, 'rb', buffering=_IO_BUFSIZE) as fp, \
+                        tarfile.open(fileobj=fp, mode='r|*') as tar_ref:
                     tar_ref.extractall(extract_to)
             else:
                 raise ValueError(f"Unsupported archive format: {archive_path.suffix}")
@@ -110,6 +223,36 @@ class FileUtils:
             print(f"✗ Failed to extract {description}: {e}")
             return False
     
+    @staticmethod
+    def _extract_zip_members(zip_ref: zipfile.ZipFile, extract_to: Path):
+        """
+        Extract all zip members, copying each in large chunks and keeping
+        Unix permission bits.
+        
+        Args:
+            zip_ref (zipfile.ZipFile): Open zip archive
+            extract_to (Path): Directory to extract to
+        """
+        root = extract_to.resolve()
+        for info in zip_ref.infolist():
+            target = (root / info.filename).resolve()
+            if target != root and root not in target.parents:
+                raise ValueError(f"Archive member escapes the target directory: {info.filename}")
+            
+            if info.is_dir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with zip_ref.open(info) as src, open(target, 'wb', buffering=_IO_BUFSIZE) as dst:
+                shutil.copyfileobj(src, dst, _COPY_BUFSIZE)
+            
+            # Keep the permission bits of archives created on Unix, so the
+            # Fiji launcher is executable straight away
+            mode = (info.external_attr >> 16) & 0o777
+            if info.create_system == 3 and mode:
+                os.chmod(target, mode)
+    
     @staticmethod
     def check_permissions(path: Union[str, Path]) -> bool:
         """
@@ -121,9 +264,13 @@ class FileUtils:
         Returns:
             bool: True if we have write permissions, False otherwise
         """
+        if get_platform() != "windows":
+            # A single access(2) call, without touching the directory
+            return os.path.isdir(path) and os.access(path, os.W_OK | os.X_OK)
+        
+        # os.access ignores ACLs on Windows, so try to create a test file
         path = Path(path)
         try:
-            # Try to create a test file
             test_file = path / "test_write_permission.tmp"
             test_file.touch()
             test_file.unlink()
@@ -157,10 +304,79 @@ class FileUtils:
             List[Path]: List of matching file paths
         """
         directory = Path(directory)
-        if not directory.exists():
+        
+        # Patterns spanning subdirectories need a full glob
+        if '/' in pattern or '\\' in pattern or '**' in pattern:
+            if not directory.exists():
+                return []
+            return list(directory.glob(pattern))
+        
+        # A single scandir pass, matching names without stat-ing entries
+        match = _compile_glob(pattern)
+        try:
+            with os.scandir(directory) as entries:
+                return [directory / entry.name for entry in entries if match(entry.name)]
+        except OSError:
             return []
+    
+    @staticmethod
+    def write_file(path: Union[str, Path], content: str):
+        """
+        Write a small text file with unbuffered os-level calls.
         
-        return list(directory.glob(pattern))
+        Args:
+            path (Union[str, Path]): File path to write (created or truncated)
+            content (str): Text to write, encoded as UTF-8
+        """
+        data = memoryview(content.encode('utf-8'))
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        fd = os.open(path, flags, 0o644)
+        try:
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+        finally:
+            os.close(fd)
+    
+    @staticmethod
+    def count_lines(path: Union[str, Path], chunk_size: int = 1 << 20) -> int:
+        """
+        Count the lines in a file without loading it into memory.
+        
+        The file is memory-mapped and scanned from the page cache; files that
+        cannot be mapped are read instead.
+        
+        Args:
+            path (Union[str, Path]): File path
+            chunk_size (int): Number of bytes scanned at a time
+            
+        Returns:
+            int: Number of lines (a final line without a newline is counted)
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return 0
+            
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                mm = None
+            
+            if mm is None:
+                count = 0
+                last_chunk = b''
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    count += chunk.count(b'\n')
+                    last_chunk = chunk
+                unterminated = bool(last_chunk) and not last_chunk.endswith(b'\n')
+            else:
+                with mm:
+                    count = sum(mm[start:start + chunk_size].count(b'\n')
+                                for start in range(0, len(mm), chunk_size))
+                    unterminated = mm[-1:] != b'\n'
+        
+        return count + 1 if unterminated else count
     
     @staticmethod
     def copy_file(src: Union[str, Path], dst: Union[str, Path]) -> bool:
@@ -175,12 +391,49 @@ class FileUtils:
             bool: True if successful, False otherwise
         """
         try:
-            shutil.copy2(src, dst)
+            dst = Path(dst)
+            if dst.is_dir():
+                dst = dst / Path(src).name
+            
+            # Opening dst for writing would truncate src if both are the same
+            # file (the same path, a hard link, or a symlink to it)
+            if dst.exists() and os.path.samefile(src, dst):
+                raise shutil.SameFileError(f"{src} and {dst} are the same file")
+            
+            with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb', buffering=0) as fdst:
+                # Copy in the kernel where os.sendfile supports files (Linux);
+                # otherwise, or for whatever it did not copy, use 1 MiB chunks
+                copied = FileUtils._sendfile(fsrc.fileno(), fdst.fileno(),
+                                             os.fstat(fsrc.fileno()).st_size)
+                fsrc.seek(copied)
+                fdst.seek(copied)
+                shutil.copyfileobj(fsrc, fdst, _COPY_BUFSIZE)
+            
+            shutil.copystat(src, dst)
             return True
         except Exception as e:
             print(f"Error copying file: {e}")
             return False
     
+    @staticmethod
+    def _sendfile(in_fd: int, out_fd: int, size: int) -> int:
+        """
+        Copy up to size bytes between file descriptors with os.sendfile.
+        
+        Returns:
+            int: Number of bytes copied (0 if os.sendfile is unavailable)
+        """
+        copied = 0
+        try:
+            while copied < size:
+                sent = os.sendfile(out_fd, in_fd, copied, min(size - copied, 1 << 30))
+                if sent == 0:
+                    break
+                copied += sent
+        except (AttributeError, OSError):
+            pass
+        return copied
+    
     @staticmethod
     def remove_file(path: Union[str, Path]) -> bool:
         """
@@ -200,6 +453,13 @@ class FileUtils:
             return False
 
 
+@functools.lru_cache(maxsize=64)
+def _compile_glob(pattern: str):
+    """Compile a glob pattern to a name matcher (case-insensitive on Windows)."""
+    flags = re.IGNORECASE if get_platform() == "windows" else 0
+    return re.compile(fnmatch.translate(pattern), flags).match
+
+
 class ImageUtils:
     """
     Utility class for image operations.
@@ -216,27 +476,39 @@ class ImageUtils:
         Returns:
             bool: True if valid TIFF, False otherwise
         """
-        path = Path(path)
+        # The extension costs no I/O, so only files that pass it are opened;
+        # the header is the reliable check (and fails for missing files)
+        return (os.path.splitext(path)[1].lower() in ('.tif', '.tiff') and
+                ImageUtils.is_tiff_magic(path))
+    
+    @staticmethod
+    def is_tiff_magic(path: Union[str, Path]) -> bool:
+        """
+        Check the 8-byte file header for a TIFF or BigTIFF signature.
         
-        # Check file exists and has correct extension
-        if not path.exists():
-            return False
+        This only reads the header; it does not decode any image data.
         
-        if path.suffix.lower() not in ['.tif', '.tiff']:
+        Args:
+            path (Union[str, Path]): Path to the file
+            
+        Returns:
+            bool: True if the header is a TIFF/BigTIFF header, False otherwise
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        except OSError:
             return False
-        
-        # Try to read the file header
         try:
-            with open(path, 'rb') as f:
-                # Read first 4 bytes to check TIFF magic number
-                magic = f.read(4)
-                # TIFF files start with either 'II*\x00' (little-endian) or 'MM\x00*' (big-endian)
-                if magic[:2] in [b'II', b'MM'] and magic[2:4] in [b'*\x00', b'\x00*']:
-                    return True
-        except Exception:
-            pass
-        
-        return False
+            return ImageUtils._is_tiff_header(os.read(fd, 8))
+        except OSError:
+            return False
+        finally:
+            os.close(fd)
+    
+    @staticmethod
+    def _is_tiff_header(header: bytes) -> bool:
+        """Check a file header for the TIFF (42) or BigTIFF (43) version number."""
+        return len(header) >= 8 and header[:4] in _TIFF_MAGIC
     
     @staticmethod
     def get_image_info(path: Union[str, Path]) -> dict:
@@ -249,21 +521,59 @@ class ImageUtils:
         Returns:
             dict: Dictionary with image information
         """
+        # Memoized per (path, mtime, size), so a file rewritten in place is read again
+        try:
+            st = os.stat(path)
+        except OSError:
+            return ImageUtils.validate_and_info(path)[1]
+        return dict(_cached_info(str(path), st.st_mtime_ns, st.st_size))
+    
+    @staticmethod
+    def validate_and_info(path: Union[str, Path]) -> Tuple[bool, dict]:
+        """
+        Validate a TIFF file and get its image information with a single open.
+        
+        Args:
+            path (Union[str, Path]): Path to the image file
+            
+        Returns:
+            Tuple[bool, dict]: Whether the file is a valid TIFF, and a
+            dictionary with image information (as from get_image_info)
+        """
         path = Path(path)
         info = {
             'path': str(path),
-            'exists': path.exists(),
-            'size_bytes': path.stat().st_size if path.exists() else 0,
+            'exists': False,
+            'size_bytes': 0,
             'valid_tiff': False
         }
         
-        if path.exists():
-            info['valid_tiff'] = ImageUtils.validate_tiff_file(path)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            info['exists'] = path.exists()
+            return False, info
+        
+        with f:
+            info['exists'] = True
+            info['size_bytes'] = os.fstat(f.fileno()).st_size
+            header = f.read(8)
+            is_tiff = ImageUtils._is_tiff_header(header)
+            info['valid_tiff'] = is_tiff and path.suffix.lower() in ['.tif', '.tiff']
+            
+            # TIFF metadata is read straight from the IFDs, without decoding pixels
+            if is_tiff:
+                try:
+                    info.update(ImageUtils._read_tiff_ifds(f, header))
+                    return info['valid_tiff'], info
+                except (struct.error, OSError, ValueError):
+                    pass
             
             # Try to get more detailed info using PIL if available
             try:
                 from PIL import Image
-                with Image.open(path) as img:
+                f.seek(0)
+                with Image.open(f) as img:
                     info.update({
                         'width': img.width,
                         'height': img.height,
@@ -278,6 +588,67 @@ class ImageUtils:
                 info['error'] = str(e)
                 print(f"Warning: Could not get detailed image info: {e}")
         
+        return info['valid_tiff'], info
+    
+    @staticmethod
+    def _read_tiff_ifds(f, header: bytes) -> dict:
+        """
+        Read the image size and frame count of a TIFF or BigTIFF file.
+        
+        Only the first IFD's entries are decoded; the other IFDs are just
+        followed to count the frames.
+        
+        Args:
+            f: TIFF file opened in binary mode
+            header (bytes): First 8 bytes of the file
+            
+        Returns:
+            dict: Image information (width, height, mode, format, n_frames)
+        """
+        byteorder = '<' if header[:2] == b'II' else '>'
+        if header[2:4] in (b'+\x00', b'\x00+'):
+            # BigTIFF: 8-byte offsets and counts, 20-byte entries
+            f.seek(8)
+            offset, = struct.unpack(byteorder + 'Q', f.read(8))
+            count_fmt, entry_fmt, next_fmt = 'Q', 'HHQ8s', 'Q'
+        else:
+            offset, = struct.unpack(byteorder + 'I', header[4:8])
+            count_fmt, entry_fmt, next_fmt = 'H', 'HHI4s', 'I'
+        count_fmt, entry_fmt, next_fmt = (byteorder + fmt for fmt in (count_fmt, entry_fmt, next_fmt))
+        count_size = struct.calcsize(count_fmt)
+        entry_size = struct.calcsize(entry_fmt)
+        next_size = struct.calcsize(next_fmt)
+        value_size = entry_size - struct.calcsize(entry_fmt[:-2])
+        
+        tags = {}
+        n_frames = 0
+        seen = set()
+        while offset and offset not in seen:
+            seen.add(offset)
+            f.seek(offset)
+            n_entries, = struct.unpack(count_fmt, f.read(count_size))
+            if n_frames == 0:
+                data = f.read(n_entries * entry_size)
+                for tag, field_type, count, value in struct.iter_unpack(entry_fmt, data):
+                    code = _TIFF_TYPES.get(field_type)
+                    # Only values stored inside the entry; larger ones are offsets
+                    if tag in _TIFF_TAGS and code and count * struct.calcsize(code) <= value_size:
+                        tags[_TIFF_TAGS[tag]] = struct.unpack_from(byteorder + code, value)[0]
+            else:
+                f.seek(n_entries * entry_size, os.SEEK_CUR)
+            n_frames += 1
+            offset, = struct.unpack(next_fmt, f.read(next_size))
+        
+        if 'width' not in tags or 'height' not in tags:
+            raise ValueError("TIFF image size tags not found")
+        
+        info = {'width': tags['width'], 'height': tags['height'],
+                'format': 'TIFF', 'n_frames': n_frames}
+        mode = _TIFF_MODES.get((tags.get('samples_per_pixel', 1),
+                                tags.get('bits_per_sample', 1),
+                                tags.get('sample_format', 1)))
+        if mode:
+            info['mode'] = mode
         return info
     
     @staticmethod
@@ -294,25 +665,50 @@ class ImageUtils:
         Returns:
             Optional[Path]: Path to created test image, or None if failed
         """
+        temp_path = None
         try:
             import numpy as np
-            from PIL import Image
             
-            # Create a temporary file
+            try:
+                import tifffile
+                Image = None
+            except ImportError:
+                tifffile = None
+                from PIL import Image
+            
+            # Create the temporary file only once a writer is available
             temp_file = tempfile.NamedTemporaryFile(suffix='.tif', delete=False)
             temp_path = Path(temp_file.name)
             temp_file.close()
             
+            rng = np.random.default_rng()
+            shape = (n_frames, height, width)
+            nbytes = n_frames * height * width
+            
+            if tifffile is not None and nbytes > _TEST_IMAGE_MAX_BUFFER:
+                # Large stacks are generated and written a frame at a time,
+                # so memory use stays at one frame
+                frames = (rng.integers(0, 256, shape[1:], dtype=np.uint8)
+                          for _ in range(n_frames))
+                tifffile.imwrite(temp_path, frames, shape=shape, dtype=np.uint8,
+                                 photometric='minisblack', bigtiff=nbytes > 2**31)
+                return temp_path
+            
+            # Generate all frames with a single allocation
+            stack = rng.integers(0, 256, shape, dtype=np.uint8)
+            
+            # tifffile writes the stack straight from the numpy buffer
+            if tifffile is not None:
+                tifffile.imwrite(temp_path, stack if n_frames > 1 else stack[0],
+                                 photometric='minisblack', bigtiff=stack.nbytes > 2**31)
+                return temp_path
+            
             if n_frames == 1:
                 # Single frame image
-                test_image = np.random.randint(0, 255, (height, width), dtype=np.uint8)
-                Image.fromarray(test_image).save(temp_path)
+                Image.fromarray(stack[0]).save(temp_path)
             else:
-                # Multi-frame image
-                images = []
-                for i in range(n_frames):
-                    frame = np.random.randint(0, 255, (height, width), dtype=np.uint8)
-                    images.append(Image.fromarray(frame))
+                # Multi-frame image, one PIL image per view into the stack
+                images = [Image.fromarray(frame) for frame in stack]
                 
                 # Save as multi-page TIFF
                 images[0].save(temp_path, save_all=True, append_images=images[1:])
@@ -320,11 +716,20 @@ class ImageUtils:
             return temp_path
             
         except ImportError:
-            print("PIL/Pillow and numpy required for test image creation")
-            return None
+            print("numpy and tifffile or PIL/Pillow required for test image creation")
         except Exception as e:
             print(f"Error creating test image: {e}")
-            return None
+        
+        # Do not leave a partly written file behind
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
+        return None
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_info(path: str, mtime_ns: int, size: int) -> dict:
+    """Image information for a file version; callers must not modify the result."""
+    return ImageUtils.validate_and_info(path)[1]
 
 
 class ProcessUtils:
@@ -336,7 +741,8 @@ class ProcessUtils:
     def run_command(cmd: List[str], 
                    timeout: int = 300, 
                    capture_output: bool = True,
-                   cwd: Optional[str] = None) -> Tuple[int, str, str]:
+                   cwd: Optional[str] = None,
+                   stream: bool = False) -> Tuple[int, str, str]:
         """
         Run a command and return the result.
         
@@ -345,10 +751,16 @@ class ProcessUtils:
             timeout (int): Timeout in seconds
             capture_output (bool): Whether to capture output
             cwd (Optional[str]): Working directory
+            stream (bool): Echo output line by line while the command runs
+                (output is still captured and returned)
             
         Returns:
             Tuple[int, str, str]: Return code, stdout, stderr
         """
+        if stream:
+            return ProcessUtils.run_coroutine(
+                ProcessUtils.run_command_async(cmd, timeout, cwd, stream=True))
+        
         try:
             result = subprocess.run(
                 cmd, 
@@ -363,20 +775,99 @@ class ProcessUtils:
         except Exception as e:
             return -1, "", str(e)
     
+    @staticmethod
+    def run_coroutine(coro):
+        """
+        Run a coroutine to completion from synchronous code.
+        
+        asyncio.run cannot be used while an event loop is already running in
+        this thread (e.g. in a Jupyter notebook or an async caller); the
+        coroutine then runs on its own event loop in a worker thread.
+        
+        Args:
+            coro: Coroutine to run
+            
+        Returns:
+            The coroutine's result
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+    
+    @staticmethod
+    async def run_command_async(cmd: List[str],
+                                timeout: int = 300,
+                                cwd: Optional[str] = None,
+                                stream: bool = False) -> Tuple[int, str, str]:
+        """
+        Run a command without blocking the event loop and return the result.
+        
+        Args:
+            cmd (List[str]): Command to run
+            timeout (int): Timeout in seconds
+            cwd (Optional[str]): Working directory
+            stream (bool): Echo output line by line while the command runs
+            
+        Returns:
+            Tuple[int, str, str]: Return code, stdout, stderr
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+                limit=1 << 20  # Allow long output lines when reading line by line
+            )
+        except Exception as e:
+            return -1, "", str(e)
+        
+        async def drain(reader: asyncio.StreamReader, echo, lines: List[str]):
+            async for line in reader:
+                text = line.decode(errors='replace')
+                lines.append(text)
+                if stream:
+                    echo.write(text)
+                    echo.flush()
+        
+        stdout_lines: List[str] = []
+        stderr_lines: List[str] = []
+        try:
+            await asyncio.wait_for(asyncio.gather(
+                drain(process.stdout, sys.stdout, stdout_lines),
+                drain(process.stderr, sys.stderr, stderr_lines),
+                process.wait()
+            ), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return -1, "", "Process timed out"
+        
+        return process.returncode, ''.join(stdout_lines), ''.join(stderr_lines)
+    
     @staticmethod
     def is_process_running(process_name: str) -> bool:
         """
         Check if a process is running.
         
+        On Linux the name may be any part of a process's name or command
+        line, matched as plain text (see _is_process_running_proc).
+        
         Args:
             process_name (str): Name of the process to check
             
         Returns:
             bool: True if process is running, False otherwise
         """
+        if get_platform() == "linux":
+            return ProcessUtils._is_process_running_proc(process_name)
+        
         try:
-            system = platform.system().lower()
-            if system == "windows":
+            if get_platform() == "windows":
                 cmd = ["tasklist", "/FI", f"IMAGENAME eq {process_name}"]
             else:
                 cmd = ["pgrep", "-f", process_name]
@@ -385,6 +876,44 @@ class ProcessUtils:
             return result.returncode == 0 and process_name in result.stdout
         except Exception:
             return False
+    
+    @staticmethod
+    def _is_process_running_proc(process_name: str) -> bool:
+        """
+        Check for a running process by scanning /proc, without spawning pgrep.
+        
+        Like ``pgrep -f``, the name may be any part of the process name or
+        its full command line; unlike pgrep it is matched as plain text, not
+        as a regular expression. The command line also covers names longer
+        than the 15 characters the kernel keeps in /proc/<pid>/comm (e.g.
+        ImageJ-linux64 started through the Java launcher).
+        
+        Args:
+            process_name (str): Name of the process to check
+            
+        Returns:
+            bool: True if a matching process is running, False otherwise
+        """
+        name = process_name.encode()
+        try:
+            with os.scandir('/proc') as entries:
+                for entry in entries:
+                    if not entry.name.isdigit():
+                        continue
+                    try:
+                        with open(f'/proc/{entry.name}/comm', 'rb') as f:
+                            if name in f.read().rstrip(b'\n'):
+                                return True
+                        with open(f'/proc/{entry.name}/cmdline', 'rb') as f:
+                            # Arguments are NUL-separated, as pgrep -f joins them with spaces
+                            if name in f.read().replace(b'\0', b' '):
+                                return True
+                    except OSError:
+                        # The process exited while scanning
+                        continue
+        except OSError:
+            return False
+        return False
 
 
 class ConfigUtils:
@@ -404,8 +933,7 @@ class ConfigUtils:
             dict: Loaded configuration
         """
         try:
-            with open(path, 'r') as f:
-                return json.load(f)
+            return _loads(Path(path).read_bytes())
         except Exception as e:
             print(f"Error loading JSON from {path}: {e}")
             return {}
@@ -423,8 +951,7 @@ class ConfigUtils:
             bool: True if successful, False otherwise
         """
         try:
-            with open(path, 'w') as f:
-                json.dump(data, f, indent=2)
+            Path(path).write_text(_dumps(data))
             return True
         except Exception as e:
             print(f"Error saving JSON to {path}: {e}")
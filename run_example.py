@@ -6,34 +6,68 @@ This script uses the test TIFF file in the test_cases directory to demonstrate
 the complete workflow.
 """
 
+import importlib.util
+import logging
+import os
 import sys
 from pathlib import Path
 
-# Add the current directory to the path to import our package
-sys.path.insert(0, str(Path(__file__).parent))
+# Add the current directory to the path to import our package, unless the
+# package is already importable (installed, or run from this directory)
+if importlib.util.find_spec('fiji_automator') is None:
+    sys.path.insert(0, str(Path(__file__).parent))
 
-from fiji_automator import ThunderSTORMAutomator, FijiSetup, Config, ImageUtils
+# Package classes are imported inside the functions that use them, so
+# --help and --config do not load the analysis and download machinery
+
+
+# Analysis parameters used for every example file
+EXAMPLE_PARAMETERS = dict(
+    pixel_size=100.0,                    # Camera pixel size in nm
+    gain=100.0,                          # EM gain (lower for test)
+    offset=100.0,                        # Camera offset
+    processing_method="Wavelet filter (B-Spline)",
+    localization_method="PSF: Integrated Gaussian",
+    sigma=1.6,                           # Expected PSF sigma in pixels
+    fitting_radius=3,                    # Fitting radius in pixels
+    create_reconstructed_image=True      # Create super-resolved image
+)
 
 
 def check_test_file():
     """
-    Check if the test TIFF file exists and get information about it.
+    Check if test TIFF files exist and get information about the first one.
     
     Returns:
-        Path: Path to the test file if found, None otherwise
+        tuple: (test_files, img_info) with the paths to the test files, sorted
+        by name, and the first file's image information, or ([], None) if no
+        test file was found
     """
+    from fiji_automator import ImageUtils
+    
     test_cases_dir = Path(__file__).parent / "test_cases"
     
-    # Look for TIFF files in test_cases directory
-    tiff_files = list(test_cases_dir.glob("*.tif*"))
+    # A single scandir pass; the entry's type comes from the directory
+    # listing rather than a separate stat
+    test_files = []
+    try:
+        with os.scandir(test_cases_dir) as entries:
+            for entry in entries:
+                if (entry.name.lower().endswith(('.tif', '.tiff'))
+                        and entry.is_file(follow_symlinks=False)):
+                    test_files.append(Path(entry.path))
+    except OSError:
+        pass
     
-    if not tiff_files:
+    if not test_files:
         print("No TIFF files found in test_cases directory")
-        return None
+        return [], None
     
-    # Use the first TIFF file found
-    test_file = tiff_files[0]
+    test_files.sort()
+    test_file = test_files[0]
     print(f"Found test file: {test_file}")
+    if len(test_files) > 1:
+        print(f"  and {len(test_files) - 1} more in {test_cases_dir}")
     
     # Get image information
     img_info = ImageUtils.get_image_info(test_file)
@@ -45,21 +79,54 @@ def check_test_file():
     if 'n_frames' in img_info:
         print(f"Number of frames: {img_info['n_frames']}")
     
-    return test_file
+    return test_files, img_info
+
+
+def result_dir_names(paths):
+    """
+    Name an output directory for each input file after the file.
+    
+    Files with the same stem (e.g. a.tif and a.tiff, or the same name in two
+    directories) get a numbered suffix, so no two analyses share a directory.
+    
+    Args:
+        paths (list): Input file paths
+        
+    Returns:
+        list: Directory names, in input order
+    """
+    names = []
+    taken = set()
+    for path in paths:
+        name = path.stem
+        n = 1
+        # Compare case-insensitively for macOS/Windows file systems
+        while name.casefold() in taken:
+            n += 1
+            name = f"{path.stem}_{n}"
+        taken.add(name.casefold())
+        names.append(name)
+    return names
 
 
-def run_fiji_setup():
+def run_fiji_setup(test_existing=True):
     """
-    Run the Fiji setup if Fiji is not available.
+    Find Fiji, or run the setup if it is not available, and check that it runs.
+    
+    Args:
+        test_existing (bool): Run an existing installation to check that it
+            works (a fresh installation is always checked by the setup)
     
     Returns:
-        bool: True if setup successful or Fiji already available
+        ThunderSTORMAutomator: Automator for the working Fiji installation,
+        or None if Fiji could not be set up
     """
+    from fiji_automator import ThunderSTORMAutomator, FijiSetup
+    
     try:
         # Try to create automator - if this fails, Fiji is not installed
         automator = ThunderSTORMAutomator()
         print("✓ Fiji installation found")
-        return True
     except FileNotFoundError:
         print("Fiji not found. Running automatic setup...")
         
@@ -76,14 +143,24 @@ def run_fiji_setup():
             print(f"Attempting installation to: {user_install_dir}")
             setup = FijiSetup(install_dir=str(user_install_dir))
         
-        success = setup.setup_all()
-        
-        if success:
-            print("✓ Fiji setup completed successfully")
-            return True
-        else:
+        # setup_all already runs Fiji to verify the new installation
+        if not setup.setup_all():
             print("✗ Fiji setup failed")
-            return False
+            return None
+        
+        print("✓ Fiji setup completed successfully")
+        return ThunderSTORMAutomator(fiji_path=str(setup.get_fiji_executable()))
+    
+    if not test_existing:
+        return automator
+    
+    # Test the existing Fiji installation
+    print("\nTesting Fiji installation...")
+    if not automator.test_fiji_installation():
+        print("Fiji installation test failed")
+        return None
+    
+    return automator
 
 
 def run_example_analysis():
@@ -93,30 +170,23 @@ def run_example_analysis():
     Returns:
         bool: True if analysis successful
     """
-    # Check for test file
-    test_file = check_test_file()
-    if not test_file:
+    # Check for test files
+    test_files, img_info = check_test_file()
+    if not test_files:
         print("No test file found. Please add a TIFF file to the test_cases directory.")
         return False
+    test_file = test_files[0]
     
-    # Ensure Fiji is available
-    if not run_fiji_setup():
-        print("Cannot proceed without Fiji installation")
+    # Ensure Fiji is available and working
+    automator = run_fiji_setup()
+    if automator is None:
+        print("Cannot proceed without a working Fiji installation")
         return False
     
     try:
-        # Create automator instance
-        automator = ThunderSTORMAutomator()
-        
-        # Test Fiji installation
-        print("\nTesting Fiji installation...")
-        if not automator.test_fiji_installation():
-            print("Fiji installation test failed")
-            return False
-        
-        # Validate input file
+        # Validate input file with the information read by check_test_file
         print("\nValidating input file...")
-        if not automator.validate_input_file(str(test_file)):
+        if not automator.validate_input_file(str(test_file), prefetched_info=img_info):
             print("Input file validation failed")
             return False
         
@@ -127,19 +197,24 @@ def run_example_analysis():
         
         # Run ThunderSTORM analysis
         print("\nRunning ThunderSTORM analysis...")
-        success = automator.run_thunderstorm_analysis(
-            input_path=str(test_file),
-            output_dir=str(output_dir),
-            # Custom parameters for the example
-            pixel_size=100.0,                    # Camera pixel size in nm
-            gain=100.0,                          # EM gain (lower for test)
-            offset=100.0,                        # Camera offset
-            processing_method="Wavelet filter (B-Spline)",
-            localization_method="PSF: Integrated Gaussian",
-            sigma=1.6,                           # Expected PSF sigma in pixels
-            fitting_radius=3,                    # Fitting radius in pixels
-            create_reconstructed_image=True      # Create super-resolved image
-        )
+        if len(test_files) == 1:
+            result_dirs = [output_dir]
+            success = automator.run_thunderstorm_analysis(
+                input_path=str(test_file),
+                output_dir=str(output_dir),
+                **EXAMPLE_PARAMETERS
+            )
+        else:
+            # One Fiji process per file, each with its own output directory;
+            # while one JVM starts up, others are already analyzing
+            result_dirs = [output_dir / name for name in result_dir_names(test_files)]
+            results = automator.run_thunderstorm_batch(
+                [str(path) for path in test_files],
+                [str(path) for path in result_dirs],
+                max_concurrency=max(1, (os.cpu_count() or 2) // 2),
+                **EXAMPLE_PARAMETERS
+            )
+            success = all(results)
         
         if success:
             print("\n" + "="*60)
@@ -148,16 +223,26 @@ def run_example_analysis():
             print(f"Results saved in: {output_dir}")
             print("\nGenerated files:")
             
-            # List output files
-            for file_path in output_dir.iterdir():
-                if file_path.is_file():
-                    size_mb = file_path.stat().st_size / (1024 * 1024)
-                    print(f"  📄 {file_path.name} ({size_mb:.2f} MB)")
+            # List output files; the directory entries carry the file type,
+            # so only the size needs a stat. The listing is written at once
+            # rather than one print per file.
+            lines = []
+            for result_dir in result_dirs:
+                with os.scandir(result_dir) as entries:
+                    files = sorted((e for e in entries if e.is_file(follow_symlinks=False)),
+                                   key=lambda e: e.name)
+                prefix = "" if result_dir == output_dir else f"{result_dir.name}/"
+                for entry in files:
+                    size_mb = entry.stat().st_size / (1024 * 1024)
+                    lines.append(f"  📄 {prefix}{entry.name} ({size_mb:.2f} MB)")
             
-            print("\nNext steps:")
-            print("1. Open results.csv to view localization data")
-            print("2. View reconstructed_image.tif for super-resolved image")
-            print("3. Check thunderstorm_macro.ijm for the generated macro")
+            lines += [
+                "",
+                "Next steps:",
+                "1. Open results.csv to view localization data",
+                "2. View reconstructed_image.tif for super-resolved image",
+            ]
+            print("\n".join(lines))
             
             return True
         else:
@@ -175,6 +260,8 @@ def show_configuration():
     """
     Display current configuration settings.
     """
+    from fiji_automator import Config
+    
     print("\n" + "="*50)
     print("Configuration Settings")
     print("="*50)
@@ -196,6 +283,9 @@ def main():
     """
     Main function to run the example.
     """
+    # Show the automator's progress messages on the console
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    
     print("🔬 Fiji Automator - Example Analysis")
     print("="*50)
     
@@ -205,7 +295,8 @@ def main():
             show_configuration()
             return
         elif sys.argv[1] == "--setup-only":
-            success = run_fiji_setup()
+            # Only set up Fiji; an existing installation is not launched
+            success = run_fiji_setup(test_existing=False) is not None
             sys.exit(0 if success else 1)
         elif sys.argv[1] == "--help":
             print("Usage:")
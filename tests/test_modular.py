@@ -4,16 +4,116 @@ Test suite for the modular Fiji Automator package.
 """
 
 import os
+import io
+import importlib.util
 import sys
+import json
+import hashlib
 import unittest
 import tempfile
 import shutil
+import subprocess
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Add the parent directory to the path to import our package
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from fiji_automator import ThunderSTORMAutomator, FijiSetup, Config, ImageUtils, FileUtils
+from fiji_automator.core import JobPaths, ThunderSTORMSession
+from fiji_automator.config import get_config
+from fiji_automator.utils import ConfigUtils, ProcessUtils
+
+# create_test_image needs numpy, and tifffile or PIL to write the file;
+# probed by module lookup, without importing them
+HAVE_IMAGE_LIBS = (importlib.util.find_spec('numpy') is not None and
+                   (importlib.util.find_spec('tifffile') is not None or
+                    importlib.util.find_spec('PIL') is not None))
+
+
+# Cache directory of the global configuration while the tests run
+_test_cache_dir = None
+_user_cache_dir = None
+
+
+def setUpModule():
+    """Point the shared configuration's cache at a temporary directory."""
+    global _test_cache_dir, _user_cache_dir
+    _user_cache_dir = get_config().get_cache_dir()
+    _test_cache_dir = tempfile.mkdtemp(prefix="fiji_automator_cache_")
+    get_config().set('cache.dir', _test_cache_dir)
+
+
+def tearDownModule():
+    """Restore the user's cache directory."""
+    get_config().set('cache.dir', _user_cache_dir)
+    shutil.rmtree(_test_cache_dir, ignore_errors=True)
+
+
+def write_fake_fiji(path: Path):
+    """
+    Write an executable stand-in for Fiji.
+    
+    With -eval it prints the macro and exits; otherwise it speaks the
+    session's stdin protocol.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "if '-eval' in sys.argv:\n"
+        "    print('ran: ' + sys.argv[sys.argv.index('-eval') + 1].strip())\n"
+        "    sys.exit(0)\n"
+        "for line in sys.stdin:\n"
+        "    line = line.rstrip('\\n')\n"
+        "    if line == '<<<EXIT>>>':\n"
+        "        break\n"
+        "    if line == '<<<END>>>':\n"
+        "        print('<<<DONE>>> null', flush=True)\n"
+        "    else:\n"
+        "        print('ran: ' + line, flush=True)\n")
+    path.chmod(0o755)
+
+
+def find_test_tiffs() -> list:
+    """List the TIFF files in test_cases with one scandir pass."""
+    test_cases_dir = Path(__file__).parent.parent / "test_cases"
+    try:
+        with os.scandir(test_cases_dir) as entries:
+            return [Path(entry.path) for entry in entries
+                    if entry.name.lower().endswith(('.tif', '.tiff'))
+                    and entry.is_file(follow_symlinks=False)]
+    except OSError:
+        return []
+
+
+class ClassTempDirTestCase(unittest.TestCase):
+    """
+    Test case sharing one temporary directory across the tests of a class.
+    
+    Each test gets its own subdirectory, named after the test method, so
+    tests stay independent while the directory tree is only created and
+    removed once per class.
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        """Create the class's temporary directory."""
+        cls._class_temp_dir = tempfile.TemporaryDirectory(prefix=f"{cls.__name__}_")
+        cls._class_root = Path(cls._class_temp_dir.name)
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the class's temporary directory and everything the tests left in it."""
+        cls._class_temp_dir.cleanup()
+    
+    def make_test_dir(self) -> Path:
+        """Create the current test's subdirectory."""
+        test_dir = self._class_root / self._testMethodName
+        test_dir.mkdir()
+        return test_dir
 
 
 class TestConfig(unittest.TestCase):
@@ -37,6 +137,66 @@ class TestConfig(unittest.TestCase):
         # Test default value
         self.assertEqual(self.config.get('nonexistent.key', 'default'), 'default')
     
+    def test_set_does_not_affect_other_instances(self):
+        """Test that modifying one config leaves the shared defaults intact."""
+        self.config.set('analysis.timeout', 10)
+        self.assertEqual(self.config.get_analysis_timeout(), 10)
+        self.assertEqual(Config().get_analysis_timeout(), 300)
+        
+        self.config.set('thunderstorm.default_parameters.sigma', 2.0)
+        self.assertEqual(self.config.get_default_parameters()['sigma'], 2.0)
+        self.assertEqual(Config().get_default_parameters()['sigma'], 1.6)
+    
+    def test_returned_values_are_copies(self):
+        """Test that changing returned values leaves the shared defaults intact."""
+        params = self.config.get_default_parameters()
+        params['sigma'] = 0.0
+        self.config.get_fiji_install_paths().append('/elsewhere/fiji')
+        self.config.get('fiji.urls')['other'] = 'https://example.com/fiji.zip'
+        
+        for config in (self.config, Config()):
+            self.assertEqual(config.get_default_parameters()['sigma'], 1.6)
+            self.assertNotIn('/elsewhere/fiji', config.get_fiji_install_paths())
+            self.assertNotIn('other', config.get_fiji_urls())
+    
+    def test_getters_follow_every_change(self):
+        """Test that the accessors reflect changes made through any public path."""
+        with self.assertRaises(TypeError):
+            self.config.config['analysis']['timeout'] = 1
+        self.assertEqual(self.config.get_analysis_timeout(), 300)
+        
+        self.config.set('analysis', {'timeout': 20, 'output_files': ['results.csv']})
+        self.assertEqual(self.config.get_analysis_timeout(), 20)
+        self.assertEqual(self.config.get_expected_output_files(), ['results.csv'])
+        
+        self.config._merge_config({'thunderstorm': {'default_parameters': {'gain': 5.0}}})
+        self.assertEqual(self.config.get_default_parameters()['gain'], 5.0)
+        self.assertEqual(self.config.config['thunderstorm']['default_parameters']['gain'], 5.0)
+        self.assertEqual(Config().get_default_parameters()['gain'], 100.0)
+    
+    def test_merge_config(self):
+        """Test merging a nested custom configuration."""
+        self.config._merge_config({
+            'analysis': {'timeout': 60},
+            'thunderstorm': {'default_parameters': {'sigma': 2.0}}
+        })
+        self.assertEqual(self.config.get_analysis_timeout(), 60)
+        self.assertEqual(self.config.get('thunderstorm.default_parameters.sigma'), 2.0)
+        self.assertEqual(self.config.get('thunderstorm.default_parameters.gain'), 100.0)
+    
+    def test_save_and_load_config_file(self):
+        """Test round-tripping configuration through a JSON file."""
+        temp_dir = Path(tempfile.mkdtemp())
+        try:
+            config_file = temp_dir / "config.json"
+            self.config.set('analysis.timeout', 42)
+            self.config.save_config(str(config_file))
+            
+            loaded = Config(str(config_file))
+            self.assertEqual(loaded.get_analysis_timeout(), 42)
+        finally:
+            shutil.rmtree(temp_dir)
+    
     def test_fiji_configuration(self):
         """Test Fiji-specific configuration."""
         fiji_urls = self.config.get_fiji_urls()
@@ -51,6 +211,50 @@ class TestConfig(unittest.TestCase):
         self.assertIsInstance(default_dir, str)
         self.assertGreater(len(default_dir), 0)
     
+    def test_platform_values_follow_set(self):
+        """Test that current-platform accessors reflect later changes."""
+        platform = self.config.platform
+        self.assertEqual(self.config.get_fiji_url(), self.config.get_fiji_urls()[platform])
+        
+        self.config.set(f'fiji.install_paths.{platform}', ['/custom/fiji'])
+        self.config.set(f'fiji.urls.{platform}', 'https://example.com/fiji.zip')
+        self.assertEqual(self.config.get_fiji_install_paths(), ['/custom/fiji'])
+        self.assertEqual(self.config.get_fiji_url(), 'https://example.com/fiji.zip')
+    
+    def test_resolve_existing_install_path(self):
+        """Test resolving the first existing Fiji installation path."""
+        temp_dir = Path(tempfile.mkdtemp())
+        try:
+            first = temp_dir / "ImageJ-first"
+            second = temp_dir / "ImageJ-second"
+            second.touch()
+            candidates = [str(temp_dir / "missing" / "ImageJ"), str(first), str(second)]
+            self.config.set(f'fiji.install_paths.{self.config.platform}', candidates)
+            self.assertEqual(self.config.resolve_existing_install_path(), str(second))
+            
+            first.touch()
+            self.assertEqual(self.config.resolve_existing_install_path(), str(first))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_resolve_install_path_ignores_case_on_macos_and_windows(self):
+        """Test that a candidate spelled differently from the directory entry is found."""
+        from unittest import mock
+        from fiji_automator import config as config_module
+        temp_dir = Path(tempfile.mkdtemp())
+        try:
+            (temp_dir / "imagej-linux64").touch()
+            candidate = str(temp_dir / "ImageJ-linux64")
+            self.config.set(f'fiji.install_paths.{self.config.platform}', [candidate])
+            # Stand in for a case-insensitive file system, where the path exists
+            with mock.patch('os.path.isfile', return_value=True):
+                with mock.patch.object(config_module, '_CASE_INSENSITIVE_FS', True):
+                    self.assertEqual(self.config.resolve_existing_install_path(), candidate)
+                with mock.patch.object(config_module, '_CASE_INSENSITIVE_FS', False):
+                    self.assertIsNone(self.config.resolve_existing_install_path())
+        finally:
+            shutil.rmtree(temp_dir)
+    
     def test_thunderstorm_configuration(self):
         """Test ThunderSTORM-specific configuration."""
         api_url = self.config.get_thunderstorm_api_url()
@@ -62,17 +266,12 @@ class TestConfig(unittest.TestCase):
         self.assertIn('gain', default_params)
 
 
-class TestFileUtils(unittest.TestCase):
+class TestFileUtils(ClassTempDirTestCase):
     """Test cases for the FileUtils module."""
     
     def setUp(self):
         """Set up test environment."""
-        self.test_dir = Path(tempfile.mkdtemp())
-    
-    def tearDown(self):
-        """Clean up test environment."""
-        if self.test_dir.exists():
-            shutil.rmtree(self.test_dir)
+        self.test_dir = self.make_test_dir()
     
     def test_ensure_directory(self):
         """Test directory creation."""
@@ -112,7 +311,88 @@ class TestFileUtils(unittest.TestCase):
         # Find all files
         all_files = FileUtils.find_files(self.test_dir, "*")
         self.assertEqual(len(all_files), 3)
+        
+        # Patterns with subdirectories
+        (self.test_dir / "sub").mkdir()
+        (self.test_dir / "sub" / "test3.txt").touch()
+        self.assertEqual(FileUtils.find_files(self.test_dir, "sub/*.txt"),
+                         [self.test_dir / "sub" / "test3.txt"])
+        self.assertEqual(len(FileUtils.find_files(self.test_dir, "**/*.txt")), 3)
+        self.assertEqual(FileUtils.find_files(self.test_dir / "missing", "*.txt"), [])
     
+    def test_write_file(self):
+        """Test writing a text file, replacing existing content."""
+        target = self.test_dir / "macro.ijm"
+        target.write_text("old content that is longer")
+        FileUtils.write_file(target, 'print("µ");\n')
+        self.assertEqual(target.read_text(encoding='utf-8'), 'print("µ");\n')
+    
+    def test_count_lines(self):
+        """Test streaming line counting."""
+        csv_file = self.test_dir / "results.csv"
+        csv_file.write_text("x,y\n1,2\n3,4\n")
+        self.assertEqual(FileUtils.count_lines(csv_file), 3)
+        
+        # Final line without a trailing newline, read in small chunks
+        csv_file.write_text("x,y\n1,2\n3,4")
+        self.assertEqual(FileUtils.count_lines(csv_file, chunk_size=2), 3)
+        
+        csv_file.write_text("")
+        self.assertEqual(FileUtils.count_lines(csv_file), 0)
+
+    def test_download_file(self):
+        """Test downloading from a file:// URL."""
+        source = self.test_dir / "source.bin"
+        source.write_bytes(os.urandom(3 * (1 << 20) + 7))
+        dest = self.test_dir / "dest.bin"
+
+        self.assertTrue(FileUtils.download_file(source.as_uri(), dest, show_progress=False))
+        self.assertEqual(dest.read_bytes(), source.read_bytes())
+
+        self.assertFalse(FileUtils.download_file((self.test_dir / "missing").as_uri(),
+                                                 dest, show_progress=False))
+
+        digest = hashlib.sha256(source.read_bytes()).hexdigest()
+        self.assertTrue(FileUtils.download_file(source.as_uri(), dest, show_progress=False,
+                                                sha256=digest.upper()))
+        self.assertFalse(FileUtils.download_file(source.as_uri(), dest, show_progress=False,
+                                                 sha256="0" * 64))
+        self.assertFalse(dest.exists())
+
+    def test_extract_archive(self):
+        """Test extracting zip and tar archives."""
+        import tarfile
+        import zipfile
+
+        zip_path = self.test_dir / "Fiji.zip"
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr("Fiji.app/", "")
+            zf.writestr("Fiji.app/plugins/readme.txt", "plugins")
+            launcher = zipfile.ZipInfo("Fiji.app/ImageJ-linux64")
+            launcher.create_system = 3
+            launcher.external_attr = 0o755 << 16
+            zf.writestr(launcher, "#!/bin/sh\n")
+        self.assertTrue(FileUtils.extract_archive(zip_path, self.test_dir / "zip_out"))
+        self.assertEqual(
+            (self.test_dir / "zip_out" / "Fiji.app" / "plugins" / "readme.txt").read_text(),
+            "plugins")
+        if os.name != 'nt':
+            launcher_mode = (self.test_dir / "zip_out" / "Fiji.app" / "ImageJ-linux64").stat().st_mode
+            self.assertEqual(launcher_mode & 0o777, 0o755)
+
+        tar_path = self.test_dir / "Fiji.tar"
+        with tarfile.open(tar_path, 'w') as tf:
+            tf.add(zip_path, arcname="Fiji.zip")
+        self.assertTrue(FileUtils.extract_archive(tar_path, self.test_dir / "tar_out"))
+        self.assertTrue((self.test_dir / "tar_out" / "Fiji.zip").exists())
+
+        # Members must not be written outside the target directory
+        bad_zip = self.test_dir / "bad.zip"
+        with zipfile.ZipFile(bad_zip, 'w') as zf:
+            zf.writestr("../escaped.txt", "x")
+        self.assertFalse(FileUtils.extract_archive(bad_zip, self.test_dir / "bad_out"))
+        self.assertFalse((self.test_dir / "escaped.txt").exists())
+
     def test_copy_and_remove_file(self):
         """Test file copying and removal."""
         # Create a test file
@@ -129,6 +409,33 @@ class TestFileUtils(unittest.TestCase):
         self.assertTrue(FileUtils.remove_file(dest_file))
         self.assertFalse(dest_file.exists())
 
+        # Copy a multi-chunk file into a directory, keeping its timestamps
+        big_file = self.test_dir / "big.bin"
+        big_file.write_bytes(os.urandom(2 * (1 << 20) + 3))
+        os.utime(big_file, (1_000_000_000, 1_000_000_000))
+        dest_dir = FileUtils.ensure_directory(self.test_dir / "copies")
+        self.assertTrue(FileUtils.copy_file(big_file, dest_dir))
+        self.assertEqual((dest_dir / "big.bin").read_bytes(), big_file.read_bytes())
+        self.assertEqual((dest_dir / "big.bin").stat().st_mtime, 1_000_000_000)
+
+        # Copying a file onto itself or a link to it fails and leaves it intact
+        self.assertFalse(FileUtils.copy_file(source_file, source_file))
+        self.assertFalse(FileUtils.copy_file(source_file, self.test_dir))
+        os.link(source_file, self.test_dir / "hardlink.txt")
+        self.assertFalse(FileUtils.copy_file(source_file, self.test_dir / "hardlink.txt"))
+        if hasattr(os, 'symlink') and os.name != 'nt':
+            os.symlink(source_file, self.test_dir / "symlink.txt")
+            self.assertFalse(FileUtils.copy_file(self.test_dir / "symlink.txt", source_file))
+        self.assertEqual(source_file.read_text(), "test content")
+
+    def test_config_utils_json_round_trip(self):
+        """Test saving and loading JSON through ConfigUtils."""
+        path = self.test_dir / "settings.json"
+        data = {"sigma": 1.6, "paths": ["a", "b"], "nested": {"enabled": True}}
+        self.assertTrue(ConfigUtils.save_json(data, path))
+        self.assertEqual(ConfigUtils.load_json(path), data)
+        self.assertEqual(ConfigUtils.load_json(self.test_dir / "missing.json"), {})
+
 
 class TestImageUtils(unittest.TestCase):
     """Test cases for the ImageUtils module."""
@@ -145,41 +452,175 @@ class TestImageUtils(unittest.TestCase):
             self.assertFalse(ImageUtils.validate_tiff_file(temp_file.name))
         finally:
             os.unlink(temp_file.name)
-    
+
+    def test_is_tiff_magic(self):
+        """Test the TIFF/BigTIFF header check."""
+        self.assertFalse(ImageUtils.is_tiff_magic("/nonexistent/file.tif"))
+
+        headers = {
+            b'II*\x00\x08\x00\x00\x00': True,   # little-endian TIFF
+            b'MM\x00*\x00\x00\x00\x08': True,   # big-endian TIFF
+            b'II+\x00\x08\x00\x00\x00': True,   # little-endian BigTIFF
+            b'II\x00*\x00\x00\x00\x08': False,  # version in the wrong byte order
+            b'II*\x00': False,                  # truncated header
+        }
+        for header, expected in headers.items():
+            with tempfile.NamedTemporaryFile(suffix='.tif', delete=False) as f:
+                f.write(header)
+            try:
+                self.assertEqual(ImageUtils.is_tiff_magic(f.name), expected, header)
+            finally:
+                os.unlink(f.name)
+
     def test_get_image_info(self):
         """Test getting image information."""
         # Test with non-existent file
         info = ImageUtils.get_image_info("/nonexistent/file.tif")
         self.assertFalse(info['exists'])
         self.assertEqual(info['size_bytes'], 0)
-    
+
+    def test_get_image_info_reads_tiff_header(self):
+        """Test reading the size and frame count from TIFF and BigTIFF IFDs."""
+        import struct
+
+        def ifd(entries, next_offset, bigtiff):
+            # entries: (tag, type, value) with SHORT (3) or LONG (4) values
+            if bigtiff:
+                data = struct.pack('<Q', len(entries))
+                for tag, field_type, value in entries:
+                    data += struct.pack('<HHQ', tag, field_type, 1) + struct.pack('<Q', value)
+                return data + struct.pack('<Q', next_offset)
+            data = struct.pack('<H', len(entries))
+            for tag, field_type, value in entries:
+                code = '<H2x' if field_type == 3 else '<I'
+                data += struct.pack('<HHI', tag, field_type, 1) + struct.pack(code, value)
+            return data + struct.pack('<I', next_offset)
+
+        entries = [(256, 4, 20), (257, 3, 10), (258, 3, 16)]
+        classic = b'II*\x00' + struct.pack('<I', 8)
+        classic += ifd(entries, 8 + 2 + 3 * 12 + 4, False)
+        classic += ifd(entries, 0, False)
+        bigtiff = b'II+\x00' + struct.pack('<HHQ', 8, 0, 16) + ifd(entries, 0, True)
+
+        for data, n_frames in ((classic, 2), (bigtiff, 1)):
+            with tempfile.NamedTemporaryFile(suffix='.tif', delete=False) as f:
+                f.write(data)
+            try:
+                is_valid, info = ImageUtils.validate_and_info(f.name)
+                self.assertTrue(is_valid)
+                self.assertEqual((info['width'], info['height']), (20, 10))
+                self.assertEqual(info['n_frames'], n_frames)
+                self.assertEqual(info['mode'], 'I;16')
+            finally:
+                os.unlink(f.name)
+
+    def test_get_image_info_follows_file_changes(self):
+        """Test that cached image information is refreshed when the file changes."""
+        with tempfile.NamedTemporaryFile(suffix='.tif', delete=False) as f:
+            f.write(b'II*\x00\x08\x00\x00\x00')
+        try:
+            info = ImageUtils.get_image_info(f.name)
+            self.assertEqual(info['size_bytes'], 8)
+            self.assertTrue(info['valid_tiff'])
+
+            # Modifying the returned dict must not affect later lookups
+            info['size_bytes'] = -1
+            self.assertEqual(ImageUtils.get_image_info(f.name)['size_bytes'], 8)
+
+            with open(f.name, 'wb') as out:
+                out.write(b'not a tiff file')
+            info = ImageUtils.get_image_info(f.name)
+            self.assertEqual(info['size_bytes'], 15)
+            self.assertFalse(info['valid_tiff'])
+        finally:
+            os.unlink(f.name)
+
+    @unittest.skipUnless(HAVE_IMAGE_LIBS, "numpy and tifffile or PIL not available")
     def test_create_test_image(self):
         """Test test image creation."""
+        test_image_path = ImageUtils.create_test_image(50, 50, 1)
+        self.assertIsNotNone(test_image_path)
         try:
-            test_image_path = ImageUtils.create_test_image(50, 50, 1)
-            if test_image_path:
-                self.assertTrue(test_image_path.exists())
-                self.assertTrue(ImageUtils.validate_tiff_file(test_image_path))
-                
-                # Clean up
-                test_image_path.unlink()
-        except ImportError:
-            self.skipTest("PIL/numpy not available for image creation")
-
-
-class TestFijiSetup(unittest.TestCase):
+            self.assertTrue(ImageUtils.validate_tiff_file(test_image_path))
+        finally:
+            test_image_path.unlink()
+
+    def test_create_test_image_leaves_no_file_on_failure(self):
+        """Test that a failed test image creation leaves no temporary file."""
+        from unittest import mock
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # Without a TIFF writer the image cannot be created
+            with mock.patch.object(tempfile, 'tempdir', temp_dir), \
+                    mock.patch.dict(sys.modules, {'tifffile': None, 'PIL': None}):
+                self.assertIsNone(ImageUtils.create_test_image(50, 50, 1))
+            self.assertEqual(os.listdir(temp_dir), [])
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestProcessUtils(unittest.TestCase):
+    """Test cases for the ProcessUtils module."""
+    
+    def test_run_command_stream_inside_event_loop(self):
+        """Test that streaming a command works when an event loop is already running."""
+        import asyncio
+        
+        async def caller():
+            return ProcessUtils.run_command([sys.executable, '-c', 'print("streamed")'],
+                                            timeout=30, stream=True)
+        
+        returncode, stdout, stderr = asyncio.run(caller())
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout.strip(), "streamed")
+    
+    @unittest.skipUnless(sys.platform.startswith('linux'), "Reads /proc")
+    def test_is_process_running(self):
+        """Test finding a running process by name."""
+        with open('/proc/self/comm') as f:
+            own_name = f.read().strip()
+        self.assertTrue(ProcessUtils.is_process_running(own_name))
+        self.assertFalse(ProcessUtils.is_process_running("no-such-process-name"))
+
+        # Names longer than /proc/<pid>/comm holds, and parts of them, are
+        # found through the command line
+        marker = "ImageJ-linux64-test-" + str(os.getpid())
+        proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)", marker])
+        try:
+            # The command line can show up in /proc shortly after the process starts
+            deadline = time.monotonic() + 10
+            while not ProcessUtils.is_process_running(marker) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(ProcessUtils.is_process_running(marker))
+            self.assertTrue(ProcessUtils.is_process_running(marker[7:]))
+        finally:
+            proc.kill()
+            proc.wait()
+    
+    def test_run_command_stream(self):
+        """Test that streamed output is still captured and returned."""
+        cmd = [sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"]
+        returncode, stdout, stderr = ProcessUtils.run_command(cmd, timeout=30, stream=True)
+        self.assertEqual(returncode, 0)
+        self.assertEqual(stdout.strip(), "out")
+        self.assertEqual(stderr.strip(), "err")
+    
+    def test_run_command_stream_timeout(self):
+        """Test that a streamed command is killed on timeout."""
+        cmd = [sys.executable, "-c", "import time; time.sleep(10)"]
+        returncode, _, stderr = ProcessUtils.run_command(cmd, timeout=1, stream=True)
+        self.assertEqual(returncode, -1)
+        self.assertEqual(stderr, "Process timed out")
+
+
+class TestFijiSetup(ClassTempDirTestCase):
     """Test cases for the FijiSetup module."""
     
     def setUp(self):
         """Set up test environment."""
-        self.test_dir = Path(tempfile.mkdtemp())
+        self.test_dir = self.make_test_dir()
         self.setup = FijiSetup(install_dir=str(self.test_dir))
     
-    def tearDown(self):
-        """Clean up test environment."""
-        if self.test_dir.exists():
-            shutil.rmtree(self.test_dir)
-    
     def test_initialization(self):
         """Test FijiSetup initialization."""
         self.assertEqual(self.setup.install_dir, self.test_dir)
@@ -204,6 +645,91 @@ class TestFijiSetup(unittest.TestCase):
             elif self.setup.platform == "darwin":
                 self.assertTrue("MacOS" in path_str)
     
+    def test_existing_install_is_kept_without_force(self):
+        """Test that an existing Fiji is kept without prompting unless forced."""
+        self.setup.fiji_dir.mkdir(parents=True)
+        self.assertFalse(self.setup.force)
+        self.assertTrue(self.setup.download_fiji())
+        self.assertTrue(self.setup.fiji_dir.exists())
+
+    def test_remove_fiji_dir_in_background(self):
+        """Test that a replaced Fiji installation is moved aside and deleted."""
+        from fiji_automator.setup import _join_cleanup_threads
+        (self.setup.plugins_dir / "sub").mkdir(parents=True)
+        (self.setup.plugins_dir / "sub" / "file.txt").write_text("x")
+
+        self.setup._remove_fiji_dir()
+        self.assertFalse(self.setup.fiji_dir.exists())
+        _join_cleanup_threads()
+        self.assertEqual(list(self.setup.install_dir.iterdir()), [])
+
+    def test_stale_fiji_dirs_are_swept(self):
+        """Test that half-deleted installations from earlier runs are removed."""
+        from fiji_automator.setup import _join_cleanup_threads
+        self.setup.install_dir.mkdir(parents=True, exist_ok=True)
+        stale_dir = self.setup.install_dir / f"{self.setup.fiji_dir.name}.old.1"
+        (stale_dir / "plugins").mkdir(parents=True)
+        (stale_dir / "plugins" / "file.txt").write_text("x")
+        other_dir = self.setup.install_dir / "other"
+        other_dir.mkdir()
+
+        self.setup._sweep_stale_fiji_dirs()
+        _join_cleanup_threads()
+        self.assertFalse(stale_dir.exists())
+        self.assertTrue(other_dir.exists())
+
+    def test_install_thunderstorm_jar(self):
+        """Test moving a downloaded plugin jar into place."""
+        old_jar = self.setup.plugins_dir / "thunderstorm-1.0.jar"
+        old_jar.parent.mkdir(parents=True)
+        old_jar.touch()
+        new_jar = self.test_dir / "thunderstorm-1.3.jar"
+        new_jar.write_text("jar")
+
+        self.assertTrue(self.setup._install_thunderstorm_jar(new_jar, [old_jar]))
+        self.assertFalse(old_jar.exists())
+        self.assertEqual((self.setup.plugins_dir / new_jar.name).read_text(), "jar")
+
+    @unittest.skipIf(os.name == 'nt', "Uses a script with a shebang as the Fiji executable")
+    def test_fiji_execution_reuses_process(self):
+        """Test that repeated execution tests can share one Fiji process."""
+        write_fake_fiji(self.setup.get_fiji_executable())
+        with self.setup:
+            self.assertTrue(self.setup.test_fiji_execution(reuse=True))
+            pid = self.setup._session.proc.pid
+            self.assertTrue(self.setup.test_fiji_execution(reuse=True))
+            self.assertEqual(self.setup._session.proc.pid, pid)
+        self.assertIsNone(self.setup._session)
+    
+    @unittest.skipIf(os.name == 'nt', "Uses a script with a shebang as the Fiji executable")
+    def test_verify_installation_leaves_no_process(self):
+        """Test that verifying an installation runs Fiji once and keeps nothing running."""
+        write_fake_fiji(self.setup.get_fiji_executable())
+        self.setup.plugins_dir.mkdir()
+        (self.setup.plugins_dir / "thunderstorm-1.3.jar").write_text("jar")
+        self.assertTrue(self.setup.verify_installation())
+        self.assertIsNone(self.setup._session)
+
+    def test_release_info_is_cached(self):
+        """Test that the ThunderSTORM release lookup reuses a fresh cached response."""
+        release_file = self.test_dir / "release.json"
+        release_file.write_text(json.dumps({"assets": [{
+            "name": "thunderstorm-1.3.jar",
+            "browser_download_url": "https://example.com/thunderstorm-1.3.jar",
+            "size": 123
+        }]}))
+
+        # Use a private config so the shared one keeps its cache directory
+        self.setup.config = Config()
+        self.setup.config.set('cache.dir', str(self.test_dir / "cache"))
+        self.setup.config.set('thunderstorm.github_api_url', release_file.as_uri())
+
+        expected = ("https://example.com/thunderstorm-1.3.jar", "thunderstorm-1.3.jar")
+        self.assertEqual(self.setup.get_thunderstorm_download_url(), expected)
+
+        release_file.unlink()
+        self.assertEqual(self.setup.get_thunderstorm_download_url(), expected)
+
     def test_get_thunderstorm_download_url(self):
         """Test getting ThunderSTORM download URL."""
         # This test requires internet connection
@@ -241,6 +767,234 @@ class TestThunderSTORMAutomator(unittest.TestCase):
         with self.assertRaises(FileNotFoundError):
             ThunderSTORMAutomator(fiji_path="/nonexistent/path")
     
+    def test_cached_fiji_path(self):
+        """Test that a cached Fiji path is used when it still exists."""
+        from fiji_automator.config import get_config
+        
+        config = get_config()
+        original_cache_dir = config.get_cache_dir()
+        cache_dir = Path(tempfile.mkdtemp())
+        try:
+            fake_fiji = cache_dir / "ImageJ-fake"
+            fake_fiji.touch()
+            (cache_dir / "fiji_path.json").write_text(
+                json.dumps({"platform": config.platform, "path": str(fake_fiji)}))
+            config.set('cache.dir', str(cache_dir))
+            
+            automator = ThunderSTORMAutomator()
+            self.assertEqual(automator.fiji_path, str(fake_fiji))
+            
+            # A stale cache entry is ignored
+            fake_fiji.unlink()
+            self.assertIsNone(automator._load_cached_fiji_path())
+        finally:
+            config.set('cache.dir', original_cache_dir)
+            shutil.rmtree(cache_dir)
+    
+    def test_run_thunderstorm_batch_length_mismatch(self):
+        """Test that batch analysis rejects mismatched inputs and outputs."""
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        with self.assertRaises(ValueError):
+            automator.run_thunderstorm_batch(["a.tif", "b.tif"], ["out_a"])
+    
+    def test_validate_input_file_with_prefetched_info(self):
+        """Test validating image information that was already read."""
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        info = {'exists': True, 'valid_tiff': True, 'size_bytes': 100,
+                'width': 64, 'height': 64, 'n_frames': 10}
+        # The path is not looked at when the information is supplied
+        with self.assertLogs('fiji_automator.core', level='INFO') as logs:
+            self.assertTrue(automator.validate_input_file("/nonexistent/stack.tif",
+                                                          prefetched_info=info))
+        self.assertIn("Input file validation passed", logs.output[0])
+        self.assertFalse(automator.validate_input_file("/nonexistent/stack.tif",
+                                                       prefetched_info=dict(info, width=4)))
+
+    def test_validate_input_file_checks_more_than_header(self):
+        """Test that a TIFF signature alone does not pass input validation."""
+        import struct
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        temp_dir = Path(tempfile.mkdtemp())
+        try:
+            def write(name, width, height):
+                path = temp_dir / name
+                path.write_bytes(b'II*\x00' + struct.pack('<IH', 8, 2) +
+                                 struct.pack('<HHII', 256, 4, 1, width) +
+                                 struct.pack('<HHII', 257, 4, 1, height) + struct.pack('<I', 0))
+                return str(path)
+
+            self.assertTrue(automator.validate_input_file(write("ok.tif", 64, 64)))
+            self.assertFalse(automator.validate_input_file(write("ok.txt", 64, 64)))
+            self.assertFalse(automator.validate_input_file(write("tiny.tif", 4, 4)))
+            truncated = temp_dir / "truncated.tif"
+            truncated.write_bytes(b'II*\x00' + struct.pack('<I', 8))
+            self.assertFalse(automator.validate_input_file(str(truncated)))
+        finally:
+            shutil.rmtree(temp_dir)
+    
+    def test_generate_macro(self):
+        """Test ImageJ macro generation from the templates."""
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        params = dict(Config().get_default_parameters(), sigma=2.5)
+        
+        paths = JobPaths("/data/in.tif", "/data/in.tif", "/data/out", "/data/out")
+        macro = automator._generate_macro(paths, params)
+        self.assertIn('open("/data/in.tif");', macro)
+        self.assertLess(macro.index("setBatchMode(true);"), macro.index('open("/data/in.tif");'))
+        self.assertIn("sigma=2.5 ", macro)
+        self.assertIn("/data/out/results.csv", macro)
+        self.assertIn("/data/out/reconstructed_image.tif", macro)
+        
+        params['create_reconstructed_image'] = False
+        macro = automator._generate_macro(paths, params)
+        self.assertNotIn("reconstructed_image.tif", macro)
+        self.assertIn('run("Close All");', macro)
+        
+        # Cached renderings keep values that compare equal but print differently apart
+        params['sigma'] = 2
+        self.assertIn("sigma=2 ", automator._generate_macro(paths, params))
+        params['sigma'] = 2.0
+        self.assertIn("sigma=2.0 ", automator._generate_macro(paths, params))
+    
+    def test_generate_batch_macro(self):
+        """Test generation of the single-process batch macro."""
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        params = dict(Config().get_default_parameters())
+        
+        jobs = [JobPaths("/data/a.tif", "/data/a.tif", "/out/a", "/out/a"),
+                JobPaths("/data/b.tif", "/data/b.tif", "/out/b", "/out/b")]
+        macro = automator._generate_batch_macro(jobs, params)
+        self.assertIn('inputs = newArray("/data/a.tif", "/data/b.tif");', macro)
+        self.assertIn('outputs = newArray("/out/a", "/out/b");', macro)
+        self.assertIn('outputs[f] + "/reconstructed_image.tif"', macro)
+        self.assertEqual(macro.count("{"), macro.count("}"))
+        
+        params['create_reconstructed_image'] = False
+        macro = automator._generate_batch_macro(jobs[:1], params)
+        self.assertNotIn("reconstructed_image.tif", macro)
+        self.assertEqual(macro.count("{"), macro.count("}"))
+    
+    def test_run_thunderstorm_batch_single_jvm_missing_input(self):
+        """Test that missing inputs fail without running Fiji."""
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        self.assertEqual(
+            automator.run_thunderstorm_batch_single_jvm([("/nonexistent/file.tif", "/tmp/out")]),
+            [False])
+    
+    def test_run_thunderstorm_batch_single_jvm_per_file_results(self):
+        """Test that each file of a batch is judged by its own marker and results."""
+        temp_dir = Path(tempfile.mkdtemp())
+        try:
+            fake_fiji = temp_dir / "fiji"
+            fake_fiji.write_text(
+                f"#!{sys.executable}\n"
+                "import re, sys\n"
+                "macro = sys.argv[sys.argv.index('-eval') + 1]\n"
+                "outputs = re.search(r'outputs = newArray\\((.*)\\);', macro).group(1)\n"
+                "first = outputs.split(', ')[0].strip('\"')\n"
+                "open(first + '/results.csv', 'w').write('x,y\\n1,2\\n')\n"
+                "print('<<<FILE_DONE>>> 0')\n"
+                "print('<<<FILE_FAIL>>> 1')\n")
+            fake_fiji.chmod(0o755)
+            automator = ThunderSTORMAutomator(fiji_path=str(fake_fiji))
+            
+            inputs = []
+            for name in ("a.tif", "b.tif"):
+                path = temp_dir / name
+                path.write_bytes(b'II*\x00\x08\x00\x00\x00')
+                inputs.append(str(path))
+            blocker = temp_dir / "blocker"
+            blocker.write_text("not a directory")
+            jobs = [(inputs[0], str(temp_dir / "out_a")),
+                    (inputs[1], str(temp_dir / "out_b")),
+                    (inputs[0], str(blocker / "out_c"))]
+            
+            self.assertEqual(automator.run_thunderstorm_batch_single_jvm(jobs, save_macro=True),
+                             [True, False, False])
+            # The shared macro is saved once, not into every output directory
+            self.assertTrue((temp_dir / "out_a" / "thunderstorm_macro.ijm").exists())
+            self.assertFalse((temp_dir / "out_b" / "thunderstorm_macro.ijm").exists())
+        finally:
+            shutil.rmtree(temp_dir)
+    
+    def test_prepare_analysis_evaluates_macro(self):
+        """Test that the macro is passed to Fiji directly and saved only on request."""
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        test_file = next(iter(find_test_tiffs()), None)
+        if test_file is None:
+            self.skipTest("No test TIFF files available")
+        
+        output_dir = Path(tempfile.mkdtemp())
+        try:
+            params, cmd = automator._prepare_analysis(str(test_file), str(output_dir),
+                                                      {'save_macro': False})
+            self.assertEqual(cmd[-2], '-eval')
+            self.assertIn('run("Run analysis"', cmd[-1])
+            self.assertFalse((output_dir / "thunderstorm_macro.ijm").exists())
+            
+            # Not saved by default
+            automator._prepare_analysis(str(test_file), str(output_dir), {})
+            self.assertFalse((output_dir / "thunderstorm_macro.ijm").exists())
+            
+            automator._prepare_analysis(str(test_file), str(output_dir), {'save_macro': True})
+            self.assertEqual((output_dir / "thunderstorm_macro.ijm").read_text(), cmd[-1])
+        finally:
+            shutil.rmtree(output_dir)
+
+    def test_run_thunderstorm_analysis_saves_macro(self):
+        """Test that the macro is saved for a Fiji run when requested."""
+        automator = ThunderSTORMAutomator(fiji_path=sys.executable)
+        test_file = next(iter(find_test_tiffs()), None)
+        if test_file is None:
+            self.skipTest("No test TIFF files available")
+
+        output_dir = Path(tempfile.mkdtemp())
+        try:
+            # The Python interpreter rejects Fiji's options, so the analysis fails
+            self.assertFalse(automator.run_thunderstorm_analysis(str(test_file), str(output_dir),
+                                                                 save_macro=True))
+            macro = (output_dir / "thunderstorm_macro.ijm").read_text()
+            self.assertIn('run("Run analysis"', macro)
+        finally:
+            shutil.rmtree(output_dir)
+
+    @unittest.skipIf(os.name == 'nt', "Uses a script with a shebang as the Fiji executable")
+    def test_session_runs_macros(self):
+        """Test that a session reuses one process for several macros."""
+        temp_dir = Path(tempfile.mkdtemp())
+        try:
+            fake_fiji = temp_dir / "fake_fiji"
+            write_fake_fiji(fake_fiji)
+
+            automator = ThunderSTORMAutomator(fiji_path=str(fake_fiji))
+            with ThunderSTORMSession(automator) as session:
+                pid = session.proc.pid
+                self.assertEqual(session.run_macro('print("a");', timeout=10),
+                                 (0, 'ran: print("a");\n', ""))
+                self.assertEqual(session.run_macro('print("b");', timeout=10)[0], 0)
+                self.assertEqual(session.proc.pid, pid)
+            self.assertFalse(session.running)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @unittest.skipIf(os.name == 'nt', "Uses a script with a shebang as the Fiji executable")
+    def test_session_reports_broken_pipe(self):
+        """Test that a session whose stdin broke returns a failure instead of raising."""
+        from unittest import mock
+        temp_dir = Path(tempfile.mkdtemp())
+        try:
+            fake_fiji = temp_dir / "fake_fiji"
+            write_fake_fiji(fake_fiji)
+
+            with ThunderSTORMSession(str(fake_fiji)) as session:
+                with mock.patch.object(session.proc.stdin, 'write', side_effect=BrokenPipeError):
+                    returncode, stdout, stderr = session.run_macro('print("a");', timeout=10)
+                self.assertNotEqual(returncode, 0)
+                self.assertEqual(stderr, "Fiji session exited unexpectedly")
+                self.assertFalse(session.running)
+        finally:
+            shutil.rmtree(temp_dir)
+
     def test_validate_input_file(self):
         """Test input file validation."""
         if not self.fiji_available:
@@ -259,21 +1013,27 @@ class TestThunderSTORMAutomator(unittest.TestCase):
         self.assertFalse(info['exists'])
 
 
-class TestIntegrationWithTestFile(unittest.TestCase):
+class TestRunExample(unittest.TestCase):
+    """Test cases for the example script's helpers."""
+    
+    def test_result_dir_names_are_unique(self):
+        """Test that inputs with the same stem get separate output directories."""
+        import run_example
+        paths = [Path("/data/a.tif"), Path("/data/a.tiff"), Path("/other/a.tif"),
+                 Path("/data/A.tif"), Path("/data/b.tif")]
+        self.assertEqual(run_example.result_dir_names(paths),
+                         ["a", "a_2", "a_3", "A_4", "b"])
+
+
+class TestIntegrationWithTestFile(ClassTempDirTestCase):
     """Integration tests using the test TIFF file."""
     
     def setUp(self):
         """Set up test environment."""
-        self.test_cases_dir = Path(__file__).parent.parent / "test_cases"
-        self.output_dir = Path(tempfile.mkdtemp())
+        self.output_dir = self.make_test_dir()
         
         # Find test TIFF files
-        self.test_files = list(self.test_cases_dir.glob("*.tif*"))
-    
-    def tearDown(self):
-        """Clean up test environment."""
-        if self.output_dir.exists():
-            shutil.rmtree(self.output_dir)
+        self.test_files = find_test_tiffs()
     
     def test_with_real_test_file(self):
         """Test with actual test TIFF file if available."""
@@ -290,6 +1050,11 @@ class TestIntegrationWithTestFile(unittest.TestCase):
         self.assertTrue(img_info['exists'])
         self.assertGreater(img_info['size_bytes'], 0)
         
+        # Combined validation and info should agree with the separate calls
+        is_valid, combined_info = ImageUtils.validate_and_info(test_file)
+        self.assertTrue(is_valid)
+        self.assertEqual(combined_info['size_bytes'], img_info['size_bytes'])
+        
         print(f"Test file: {test_file}")
         print(f"File size: {img_info['size_bytes'] / (1024*1024):.1f} MB")
         
@@ -297,25 +1062,66 @@ class TestIntegrationWithTestFile(unittest.TestCase):
             print(f"Dimensions: {img_info['width']} x {img_info['height']} pixels")
 
 
-def run_modular_tests():
-    """Run all modular package tests."""
+# Test classes in the order their results are reported
+TEST_CLASSES = [
+    TestConfig,
+    TestFileUtils,
+    TestImageUtils,
+    TestProcessUtils,
+    TestFijiSetup,
+    TestThunderSTORMAutomator,
+    TestRunExample,
+    TestIntegrationWithTestFile
+]
+
+
+def _run_test_class(class_name: str) -> tuple:
+    """
+    Run one test class in a worker process.
+    
+    The class gets its own temporary directory root, and its output is
+    collected so results from concurrent workers do not interleave.
+    
+    Returns:
+        tuple: (success, output)
+    """
+    test_class = globals()[class_name]
+    output = io.StringIO()
+    with tempfile.TemporaryDirectory(prefix=f"{class_name}_") as temp_root:
+        tempfile.tempdir = temp_root
+        try:
+            with contextlib.redirect_stdout(output):
+                suite = unittest.TestLoader().loadTestsFromTestCase(test_class)
+                result = unittest.TextTestRunner(stream=output, verbosity=2).run(suite)
+        finally:
+            tempfile.tempdir = None
+    return result.wasSuccessful(), output.getvalue()
+
+
+def run_modular_tests(parallel: bool = False):
+    """
+    Run all modular package tests.
+    
+    Args:
+        parallel (bool): Run the test classes concurrently in a process pool
+            instead of one after another in this process
+    """
     print("Running Modular Fiji Automator Tests...")
     print("=" * 50)
     
+    if parallel:
+        workers = min(len(TEST_CLASSES), os.cpu_count() or 1)
+        success = True
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for passed, output in pool.map(_run_test_class,
+                                           [cls.__name__ for cls in TEST_CLASSES]):
+                print(output, end="")
+                success = success and passed
+        return success
+    
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
-    
-    # Add all test classes
-    test_classes = [
-        TestConfig,
-        TestFileUtils,
-        TestImageUtils,
-        TestFijiSetup,
-        TestThunderSTORMAutomator,
-        TestIntegrationWithTestFile
-    ]
-    
-    for test_class in test_classes:
+    for test_class in TEST_CLASSES:
         suite.addTest(loader.loadTestsFromTestCase(test_class))
     
     runner = unittest.TextTestRunner(verbosity=2)
@@ -325,10 +1131,10 @@ def run_modular_tests():
 
 
 if __name__ == "__main__":
-    success = run_modular_tests()
+    success = run_modular_tests(parallel="--parallel" in sys.argv[1:])
     
     print("\n" + "=" * 50)
     print(f"Modular Tests: {'PASSED' if success else 'FAILED'}")
     print("=" * 50)
     
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    sys.exit(0 if success else 1)